@@ -84,6 +84,9 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # A file, unlike the in-memory default, lets the threads of
+        # orders.tests wait for each other's writes instead of failing
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
@@ -141,6 +144,34 @@ REST_FRAMEWORK = {
 
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True
 BASKET_SESSION_ID = 'cart'
+# Where baskets are kept: orders.cart.DatabaseBasketStore or CacheBasketStore
+BASKET_STORE = 'orders.cart.DatabaseBasketStore'
+# Seconds the products of a placed order stay reserved until it is paid
+ORDER_RESERVATION_TIMEOUT = 60 * 30
+
+# Payments are charged by PAYMENT_WORKERS background threads, see orders.payments
+PAYMENT_GATEWAY = 'orders.payments.FakeGateway'
+PAYMENT_WORKERS = 4
+PAYMENT_GATEWAY_TIMEOUT = 5
+PAYMENT_MAX_TRIES = 3
+# Seconds a fake gateway charge takes (from, to) and the share of failing ones
+FAKE_GATEWAY_LATENCY = (0.2, 1.5)
+FAKE_GATEWAY_FAILURE_RATE = 0.05
+
+# Public product endpoints cache their responses here. Run several worker
+# processes against a shared backend (e.g. FileBasedCache) so that version
+# bumps are seen by every process.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+RESPONSE_CACHE_TIMEOUT = 60 * 60
+# Seconds the responses of POSTs with an Idempotency-Key header are replayed
+IDEMPOTENCY_KEY_TIMEOUT = 60 * 60 * 24
+
+# Banner sampling weight: None (uniform), "stock" or "sale"
+BANNER_WEIGHTING = None
 
 LOGGING = {
     "version": 1,
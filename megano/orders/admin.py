@@ -1,9 +1,17 @@
 from django.contrib import admin
 
-from .models import Order
+from .models import Order, PaymentAttempt
 
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ['id', 'createdAt', 'paid', 'profile', 'phone', 'totalCost']
+    # Written by orders.inventory only, Order.save leaves them out
+    readonly_fields = Order.GUARDED_FIELDS
 
+
+@admin.register(PaymentAttempt)
+class PaymentAttemptAdmin(admin.ModelAdmin):
+    list_display = ['id', 'order', 'status', 'amount', 'tries', 'created_at', 'error']
+    list_filter = ['status']
+    readonly_fields = ['card_token', 'transaction_id']
@@ -1,40 +1,246 @@
-from rest_framework.request import Request
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, List
+
 from django.conf import settings
+from django.contrib.auth import login
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, PositiveIntegerField, Value, When
+from django.db.models.functions import Now
+from django.utils.module_loading import import_string
+from rest_framework.request import Request
 
+from products.cards import card_rows, product_cards
 from products.models import Product
-from products.serializers import ProductSerializer
+
+from .models import BasketLine
+
+BATCH_SIZE = 500
+
+
+class BaseBasketStore:
+    """Keeps product id → count lines of baskets identified by a session key."""
+
+    def lines(self, key: str) -> Dict[int, int]:
+        raise NotImplementedError
+
+    def add(self, key: str, product_id: int, quantity: int) -> None:
+        raise NotImplementedError
+
+    def add_many(self, key: str, lines: Dict[int, int]) -> None:
+        """Add several product id → quantity lines at once."""
+        for product_id, quantity in lines.items():
+            self.add(key, product_id, quantity)
+
+    def remove(self, key: str, product_id: int, quantity: int) -> None:
+        raise NotImplementedError
+
+    def clear(self, key: str) -> None:
+        raise NotImplementedError
+
+    def merge(self, source: str, target: str) -> None:
+        """Move the lines of the ``source`` basket into the ``target`` one."""
+        for product_id, count in self.lines(source).items():
+            self.add(target, product_id, count)
+        self.clear(source)
+
+    def prune(self, before: datetime) -> int:
+        """Drop baskets untouched since ``before``, return the number of lines."""
+        return 0
+
+
+class DatabaseBasketStore(BaseBasketStore):
+    """BasketLine rows changed one line at a time with atomic UPDATEs."""
+
+    def lines(self, key: str) -> Dict[int, int]:
+        return dict(
+            BasketLine.objects.filter(session_key=key)
+            .order_by("id")
+            .values_list("product_id", "count")
+        )
+
+    def add(self, key: str, product_id: int, quantity: int) -> None:
+        line = BasketLine.objects.filter(session_key=key, product_id=product_id)
+        if line.update(count=F("count") + quantity, updated_at=Now()):
+            return
+        try:
+            with transaction.atomic():
+                BasketLine.objects.create(
+                    session_key=key, product_id=product_id, count=quantity
+                )
+        except IntegrityError:
+            # Another request created the line in the meantime
+            line.update(count=F("count") + quantity, updated_at=Now())
+
+    def add_many(self, key: str, lines: Dict[int, int]) -> None:
+        # Missing lines are created empty, then all of them are increased by
+        # one UPDATE per batch, which keeps concurrent additions atomic
+        items = list(lines.items())
+        with transaction.atomic():
+            for start in range(0, len(items), BATCH_SIZE):
+                batch = items[start:start + BATCH_SIZE]
+                BasketLine.objects.bulk_create(
+                    [
+                        BasketLine(session_key=key, product_id=product_id, count=0)
+                        for product_id, _ in batch
+                    ],
+                    ignore_conflicts=True,
+                )
+                BasketLine.objects.filter(
+                    session_key=key, product_id__in=[line[0] for line in batch]
+                ).update(
+                    count=F("count")
+                    + Case(
+                        *(
+                            When(product_id=product_id, then=Value(quantity))
+                            for product_id, quantity in batch
+                        ),
+                        output_field=PositiveIntegerField(),
+                    ),
+                    updated_at=Now(),
+                )
+
+    def remove(self, key: str, product_id: int, quantity: int) -> None:
+        line = BasketLine.objects.filter(session_key=key, product_id=product_id)
+        with transaction.atomic():
+            line.filter(count__lte=quantity).delete()
+            line.filter(count__gt=quantity).update(
+                count=F("count") - quantity, updated_at=Now()
+            )
+
+    def clear(self, key: str) -> None:
+        BasketLine.objects.filter(session_key=key).delete()
+
+    def merge(self, source: str, target: str) -> None:
+        with transaction.atomic():
+            target_products = BasketLine.objects.filter(session_key=target).values(
+                "product_id"
+            )
+            shared = BasketLine.objects.filter(
+                session_key=source, product_id__in=target_products
+            )
+            self.add_many(target, dict(shared.values_list("product_id", "count")))
+            shared.delete()
+            BasketLine.objects.filter(session_key=source).update(
+                session_key=target, updated_at=Now()
+            )
+
+    def prune(self, before: datetime) -> int:
+        stale = BasketLine.objects.exclude(
+            session_key__in=BasketLine.objects.filter(
+                updated_at__gte=before
+            ).values("session_key")
+        )
+        return stale.delete()[0]
+
+
+class CacheBasketStore(BaseBasketStore):
+    """Baskets kept in the cache, e.g. the local memory cache in tests.
+
+    Lines are read and written as a whole, so concurrent changes of the same
+    basket are not atomic across processes.
+    """
+
+    key_prefix = "basket:"
+
+    def lines(self, key: str) -> Dict[int, int]:
+        return cache.get(self.key_prefix + key, {})
+
+    def _save(self, key: str, lines: Dict[int, int]) -> None:
+        cache.set(self.key_prefix + key, lines, settings.SESSION_COOKIE_AGE)
+
+    def add(self, key: str, product_id: int, quantity: int) -> None:
+        lines = self.lines(key)
+        lines[product_id] = lines.get(product_id, 0) + quantity
+        self._save(key, lines)
+
+    def add_many(self, key: str, lines: Dict[int, int]) -> None:
+        stored = self.lines(key)
+        for product_id, quantity in lines.items():
+            stored[product_id] = stored.get(product_id, 0) + quantity
+        self._save(key, stored)
+
+    def remove(self, key: str, product_id: int, quantity: int) -> None:
+        lines = self.lines(key)
+        if product_id in lines:
+            if quantity >= lines[product_id]:
+                del lines[product_id]
+            else:
+                lines[product_id] -= quantity
+            self._save(key, lines)
+
+    def clear(self, key: str) -> None:
+        cache.delete(self.key_prefix + key)
+
+
+@lru_cache(maxsize=None)
+def get_basket_store() -> BaseBasketStore:
+    return import_string(settings.BASKET_STORE)()
 
 
 class Basket:
+    """The basket of the current session, kept in the configured basket store.
+
+    Product data is read from the product cards when the basket is shown, so
+    prices stay current.
+    """
+
     def __init__(self, request: Request) -> None:
         self.session = request.session
-        basket = self.session.get(settings.BASKET_SESSION_ID)
-        if not basket:
-            basket = self.session[settings.BASKET_SESSION_ID] = {}
-        self.basket = basket
+        self.store = get_basket_store()
+        legacy = self.session.pop(settings.BASKET_SESSION_ID, None)
+        if legacy:
+            # Baskets used to be kept in the session itself
+            items = legacy["items"] if "version" in legacy else {
+                product_id: data["count"] for product_id, data in legacy.items()
+            }
+            self.store.add_many(
+                self.key,
+                {int(product_id): count for product_id, count in items.items()},
+            )
+
+    @property
+    def key(self) -> str:
+        if not self.session.session_key:
+            self.session.save()
+        return self.session.session_key
+
+    def lines(self) -> Dict[int, int]:
+        if not self.session.session_key:
+            return {}
+        return self.store.lines(self.session.session_key)
 
     def add(self, product: Product, quantity: int = 1) -> None:
-        product_id = str(product.id)
-        if product_id not in self.basket:
-            self.basket[product_id] = ProductSerializer(product).data
-            self.basket[product_id]["count"] = quantity
-        else:
-            self.basket[product_id]["count"] += quantity
-        self.save()
-
-    def save(self) -> None:
-        self.session[settings.BASKET_SESSION_ID] = self.basket
-        self.session.modified = True
+        self.store.add(self.key, product.id, quantity)
+
+    def add_many(self, lines: Dict[int, int]) -> None:
+        if lines:
+            self.store.add_many(self.key, lines)
 
     def remove(self, product: Product, quantity: int) -> None:
-        product_id = str(product)
-        if product_id in self.basket:
-            if quantity >= self.basket[product_id]["count"]:
-                del self.basket[product_id]
-            else:
-                self.basket[product_id]["count"] -= quantity
-            self.save()
+        self.store.remove(self.key, int(product), int(quantity))
 
     def clear(self) -> None:
-        del self.session[settings.BASKET_SESSION_ID]
-        self.session.modified = True
+        if self.session.session_key:
+            self.store.clear(self.session.session_key)
+
+    def products(self) -> List[Dict]:
+        """Return the cards of the products in the basket with their counts."""
+        lines = self.lines()
+        rows = dict(card_rows(Product.objects.filter(id__in=list(lines))))
+        cards = product_cards(
+            (product_id, rows[product_id]) for product_id in lines if product_id in rows
+        )
+        for card in cards:
+            card["count"] = lines[card["id"]]
+        return cards
+
+
+def login_keeping_basket(request: Request, user: User) -> None:
+    """Log the user in and carry the basket over to the new session key."""
+    old_key = request.session.session_key
+    login(request, user)
+    if old_key and old_key != request.session.session_key:
+        get_basket_store().merge(old_key, request.session.session_key)
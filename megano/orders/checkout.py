@@ -0,0 +1,178 @@
+from typing import Dict
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from rest_framework.request import Request
+
+from products.cards import card_rows, product_cards
+from products.models import Product
+from users.models import Profile
+
+from .cart import Basket, login_keeping_basket
+from .inventory import release_order
+from .models import Order, OrderItem, PaymentAttempt
+
+# Card fields kept in the order, the rest (specifications, full description,
+# review texts) is not shown there
+SNAPSHOT_FIELDS = (
+    "id",
+    "category",
+    "date",
+    "title",
+    "description",
+    "freeDelivery",
+    "images",
+    "tags",
+    "rating",
+)
+
+
+class PaymentInProgress(Exception):
+    """The order is being paid, so its items can no longer change."""
+
+
+def product_snapshot(card: Dict) -> Dict:
+    """Return the compact product data stored with an order item."""
+    snapshot = {field: card.get(field) for field in SNAPSHOT_FIELDS}
+    snapshot["reviews"] = len(card.get("reviews") or [])
+    return snapshot
+
+
+def open_order(request: Request) -> Order:
+    """Return the unpaid order of the user or session, creating it if needed.
+
+    Owners have at most one unpaid order (see ``Order.Meta.constraints``), so
+    concurrent requests creating it end up with the same order.
+    """
+    if request.user.is_authenticated:
+        return Order.objects.get_or_create(
+            paid=False,
+            profile__user=request.user,
+            defaults={"profile": Profile.objects.filter(user=request.user).first()},
+        )[0]
+    if not request.session.session_key:
+        request.session.save()
+    return Order.objects.get_or_create(
+        paid=False, session_id=request.session.session_key
+    )[0]
+
+
+def sync_order_items(order: Order, lines: Dict[int, int]) -> None:
+    """Make the order items match the basket lines and recompute the total.
+
+    Items keep the unit price, sale state and product data they had when they
+    were last synced, so the order is shown as it was placed. Only the lines
+    that changed (in count or in price) are written: new ones with one bulk
+    INSERT, changed ones with one bulk UPDATE and removed ones with one DELETE.
+    A reservation of the order is released, as it was made for the old items.
+    Orders with a payment in progress raise ``PaymentInProgress``, as the
+    amount being charged was taken from their items.
+    """
+    with transaction.atomic():
+        if order.payment_attempts.filter(status__in=PaymentAttempt.ACTIVE).exists():
+            raise PaymentInProgress(f"Order {order.pk} is being paid")
+        if order.reserved_until:
+            release_order(order)
+        prices = {
+            pk: (price, bool(on_sale))
+            for pk, price, on_sale in Product.objects.filter(
+                id__in=list(lines)
+            ).values_list("id", "price", "sale__active")
+        }
+        lines = {pk: count for pk, count in lines.items() if pk in prices}
+        existing = {
+            product_id: (pk, count, price, on_sale)
+            for pk, product_id, count, price, on_sale in OrderItem.objects.filter(
+                order=order
+            ).values_list("id", "product_id", "count", "price", "on_sale")
+        }
+        removed = [
+            item[0] for product_id, item in existing.items() if product_id not in lines
+        ]
+        changed = [
+            product_id
+            for product_id, count in lines.items()
+            if product_id not in existing
+            or existing[product_id][1:] != (count, *prices[product_id])
+        ]
+        snapshots = {
+            card["id"]: product_snapshot(card)
+            for card in product_cards(
+                card_rows(Product.objects.filter(id__in=changed))
+            )
+        }
+
+        def item(product_id: int, **fields) -> OrderItem:
+            price, on_sale = prices[product_id]
+            return OrderItem(
+                product_id=product_id,
+                count=lines[product_id],
+                price=price,
+                on_sale=on_sale,
+                product_data=snapshots.get(product_id, {}),
+                **fields,
+            )
+
+        OrderItem.objects.filter(id__in=removed).delete()
+        OrderItem.objects.bulk_update(
+            [
+                item(product_id, id=existing[product_id][0])
+                for product_id in changed
+                if product_id in existing
+            ],
+            ["count", "price", "on_sale", "product_data"],
+        )
+        OrderItem.objects.bulk_create(
+            item(product_id, order=order)
+            for product_id in changed
+            if product_id not in existing
+        )
+        order.totalCost = sum(
+            prices[product_id][0] * count for product_id, count in lines.items()
+        )
+        order.updated = False
+        order.save()
+
+
+def login_merging_orders(request: Request, user: User) -> None:
+    """Log the user in, carrying the anonymous basket and order over.
+
+    The items of an unpaid order of the user go to the basket. If there was an
+    anonymous order too, it replaces the user's order and is synced with the
+    merged basket, otherwise it is dropped. It is dropped as well when the
+    user's order has a payment in progress, which keeps that order intact.
+    Everything runs in one transaction with a fixed number of bulk queries,
+    whatever the size of the basket.
+    """
+    with transaction.atomic():
+        anonymous_order = None
+        if request.session.session_key:
+            anonymous_order = Order.objects.filter(
+                paid=False, profile__isnull=True, session_id=request.session.session_key
+            ).first()
+        login_keeping_basket(request, user)
+        # An order being paid is left as it is, its items are not merged
+        user_order = (
+            Order.objects.filter(paid=False, profile__user=user)
+            .exclude(payment_attempts__status__in=PaymentAttempt.ACTIVE)
+            .first()
+        )
+        basket = Basket(request)
+        if user_order:
+            basket.add_many(
+                dict(
+                    OrderItem.objects.filter(order=user_order).values_list(
+                        "product_id", "count"
+                    )
+                )
+            )
+        if user_order and anonymous_order:
+            # The user may only have one unpaid order, so the old one goes
+            # before the anonymous one is given to the user
+            release_order(user_order)
+            user_order.delete()
+            anonymous_order.profile = Profile.objects.get(user=user)
+            sync_order_items(anonymous_order, basket.lines())
+        elif anonymous_order:
+            release_order(anonymous_order)
+            anonymous_order.delete()
@@ -0,0 +1,66 @@
+import hashlib
+import json
+from functools import wraps
+from typing import Callable
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_KEY = "idempotency:{}"
+PENDING = "pending"
+
+
+def idempotency_cache_key(request: Request, key: str) -> str:
+    if request.user.is_authenticated:
+        owner = f"user:{request.user.id}"
+    else:
+        if not request.session.session_key:
+            request.session.save()
+        owner = f"session:{request.session.session_key}"
+    raw = json.dumps([owner, request.path, key])
+    return IDEMPOTENCY_KEY.format(hashlib.md5(raw.encode()).hexdigest())
+
+
+def idempotent(handler: Callable) -> Callable:
+    """Answer retries of an APIView POST carrying the same ``Idempotency-Key``.
+
+    The first request claims the key with ``cache.add`` and its response is
+    stored, so repeating the request replays it without running the handler.
+    A retry arriving while the first request is still running gets 409. Keys
+    of failed (5xx) requests are dropped, so those can be retried.
+    """
+
+    @wraps(handler)
+    def wrapper(view, request: Request, *args, **kwargs) -> Response:
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return handler(view, request, *args, **kwargs)
+        cache_key = idempotency_cache_key(request, key)
+        timeout = settings.IDEMPOTENCY_KEY_TIMEOUT
+        if not cache.add(cache_key, PENDING, timeout):
+            stored = cache.get(cache_key)
+            if stored is None or stored == PENDING:
+                return Response(
+                    data={"detail": "A request with this key is in progress."},
+                    status=409,
+                )
+            return Response(data=stored["data"], status=stored["status"])
+        try:
+            response = handler(view, request, *args, **kwargs)
+        except Exception:
+            cache.delete(cache_key)
+            raise
+        if response.status_code >= 500:
+            cache.delete(cache_key)
+        else:
+            cache.set(
+                cache_key,
+                {"status": response.status_code, "data": response.data},
+                timeout,
+            )
+        return response
+
+    return wrapper
@@ -0,0 +1,156 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from products.cache import bump_versions
+from products.cards import refresh_product_cards
+from products.models import Product
+
+from .models import Order, OrderItem
+
+BATCH_SIZE = 500
+# Times an order is reserved again when its reservation is released under it
+PAY_ORDER_TRIES = 3
+
+
+class InsufficientStock(Exception):
+    """Some order lines ask for more than is in stock, see ``shortages``."""
+
+    def __init__(self, shortages: List[Dict]) -> None:
+        super().__init__("Not enough products in stock")
+        self.shortages = shortages
+
+
+class ReservationConflict(Exception):
+    """The reservation of an order kept being released while it was paid."""
+
+
+class OrderChanged(Exception):
+    """The total of the order is not the amount charged for it."""
+
+
+def _stock_changed(product_ids: List[int]) -> None:
+    # Cards show the stock, so they and the cached listings are refreshed
+    refresh_product_cards(product_ids)
+    bump_versions("products")
+
+
+def reserve_order(order: Order) -> bool:
+    """Take the products of the order from stock until it is paid or expires.
+
+    Each line is taken with a conditional UPDATE that only succeeds while
+    enough is left, so concurrent orders cannot oversell a product. If any
+    line falls short nothing is taken and ``InsufficientStock`` reports all of
+    them. Returns False if the order was already reserved.
+    """
+    until = timezone.now() + timedelta(seconds=settings.ORDER_RESERVATION_TIMEOUT)
+    with transaction.atomic():
+        # Claiming the order first keeps parallel requests from reserving twice
+        if not Order.objects.filter(
+            pk=order.pk, paid=False, reserved_until__isnull=True
+        ).update(reserved_until=until):
+            return False
+        lines = list(
+            OrderItem.objects.filter(order=order, count__gt=0)
+            .order_by("product_id")
+            .values_list("product_id", "count", "product_data")
+        )
+        shortages = []
+        for product_id, count, product_data in lines:
+            if not Product.objects.filter(id=product_id, count__gte=count).update(
+                count=F("count") - count, updated_at=Now()
+            ):
+                shortages.append(
+                    {
+                        "id": product_id,
+                        "title": product_data.get("title"),
+                        "requested": count,
+                    }
+                )
+        if shortages:
+            available = dict(
+                Product.objects.filter(
+                    id__in=[line["id"] for line in shortages]
+                ).values_list("id", "count")
+            )
+            for line in shortages:
+                line["available"] = max(available.get(line["id"], 0), 0)
+            raise InsufficientStock(shortages)
+        OrderItem.objects.filter(order=order).update(reserved=F("count"))
+        _stock_changed([product_id for product_id, _, _ in lines])
+    order.reserved_until = until
+    return True
+
+
+def release_order(order: Order) -> bool:
+    """Put the reserved products of an unpaid order back in stock."""
+    with transaction.atomic():
+        if not Order.objects.filter(
+            pk=order.pk, paid=False, reserved_until__isnull=False
+        ).update(reserved_until=None):
+            return False
+        lines = list(
+            OrderItem.objects.filter(order=order, reserved__gt=0)
+            .order_by("product_id")
+            .values_list("product_id", "reserved")
+        )
+        for start in range(0, len(lines), BATCH_SIZE):
+            batch = lines[start:start + BATCH_SIZE]
+            Product.objects.filter(id__in=[line[0] for line in batch]).update(
+                count=F("count")
+                + Case(
+                    *(
+                        When(id=product_id, then=Value(reserved))
+                        for product_id, reserved in batch
+                    ),
+                    output_field=IntegerField(),
+                ),
+                updated_at=Now(),
+            )
+        OrderItem.objects.filter(order=order).update(reserved=0)
+        if lines:
+            _stock_changed([product_id for product_id, _ in lines])
+    order.reserved_until = None
+    return True
+
+
+def pay_order(order: Order, amount: Optional[Decimal] = None) -> bool:
+    """Mark the order paid, keeping its products taken from stock for good.
+
+    Returns False if the order was already paid and raises ``Order.DoesNotExist``
+    if it was deleted. With ``amount`` the order is only paid while its total
+    is that amount, otherwise ``OrderChanged`` is raised. A reservation that
+    expires and is released between reserving and paying is made again, up to
+    ``PAY_ORDER_TRIES`` times.
+    """
+    total = {} if amount is None else {"totalCost": amount}
+    for _ in range(PAY_ORDER_TRIES):
+        with transaction.atomic():
+            reserve_order(order)
+            if Order.objects.filter(
+                pk=order.pk, paid=False, reserved_until__isnull=False, **total
+            ).update(paid=True, status="Paid", paid_at=Now(), updated_at=Now()):
+                order.paid, order.status = True, "Paid"
+                return True
+        state = (
+            Order.objects.filter(pk=order.pk).values_list("paid", "totalCost").first()
+        )
+        if state is None:
+            raise Order.DoesNotExist(f"Order {order.pk} was deleted")
+        if state[0]:
+            return False
+        if amount is not None and state[1] != amount:
+            raise OrderChanged(f"Order {order.pk} costs {state[1]}, not {amount}")
+    raise ReservationConflict(f"Order {order.pk} could not be reserved")
+
+
+def release_expired_reservations(now: datetime) -> int:
+    """Release the reservations of unpaid orders that expired before ``now``."""
+    expired = Order.objects.filter(paid=False, reserved_until__lt=now)
+    return sum(release_order(order) for order in expired.only("id"))
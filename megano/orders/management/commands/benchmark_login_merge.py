@@ -0,0 +1,95 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from orders.cart import get_basket_store
+from orders.checkout import login_merging_orders
+from orders.models import Order, OrderItem
+from products.models import Product
+from users.models import Profile
+
+
+class Command(BaseCommand):
+    help = (
+        "Time logins merging an anonymous basket and order into an unpaid order "
+        "of the user, inside a rolled back transaction"
+    )
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            "--lines",
+            type=int,
+            nargs="+",
+            default=[10, 100, 1000],
+            help="Numbers of lines in each of the merged carts",
+        )
+
+    def handle(self, *args, **options) -> None:
+        for size in options["lines"]:
+            queries, elapsed = self.benchmark(size)
+            self.stdout.write(
+                f"{size} lines per cart: {queries} queries in {elapsed:.2f}s"
+            )
+
+    def benchmark(self, size: int):
+        with transaction.atomic():
+            products = Product.objects.bulk_create(
+                (
+                    Product(
+                        title=f"login benchmark {i}",
+                        description="benchmark",
+                        price=1,
+                        base_price=1,
+                        count=10 * size,
+                    )
+                    for i in range(2 * size)
+                ),
+                batch_size=1000,
+            )
+            # The carts share half of their products
+            user_products = products[:size]
+            anonymous_products = products[size // 2:size // 2 + size]
+
+            user = User.objects.create_user(username="login-benchmark")
+            profile = Profile.objects.create(user=user, fullName="Benchmark")
+            user_order = Order.objects.create(
+                profile=profile, reserved_until=timezone.now()
+            )
+            OrderItem.objects.bulk_create(
+                (
+                    OrderItem(order=user_order, product=product, count=2, reserved=2)
+                    for product in user_products
+                ),
+                batch_size=1000,
+            )
+
+            session = SessionStore()
+            session.create()
+            get_basket_store().add_many(
+                session.session_key,
+                {product.id: 1 for product in anonymous_products},
+            )
+            anonymous_order = Order.objects.create(session_id=session.session_key)
+            OrderItem.objects.bulk_create(
+                (
+                    OrderItem(order=anonymous_order, product=product)
+                    for product in anonymous_products
+                ),
+                batch_size=1000,
+            )
+
+            request = RequestFactory().post("/api/sign-in")
+            request.session = session
+            request.user = AnonymousUser()
+            started = time.perf_counter()
+            with CaptureQueriesContext(connection) as queries:
+                login_merging_orders(request, user)
+            elapsed = time.perf_counter() - started
+            transaction.set_rollback(True)
+        return len(queries), elapsed
@@ -0,0 +1,16 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from orders.cart import get_basket_store
+
+
+class Command(BaseCommand):
+    help = "Delete baskets of sessions that have expired, e.g. daily from cron"
+
+    def handle(self, *args, **options) -> None:
+        before = timezone.now() - timedelta(seconds=settings.SESSION_COOKIE_AGE)
+        deleted = get_basket_store().prune(before)
+        self.stdout.write(f"Deleted {deleted} basket lines")
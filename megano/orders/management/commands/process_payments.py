@@ -0,0 +1,89 @@
+import random
+import statistics
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from orders.models import PaymentAttempt
+from orders.payments import (
+    GatewayUnavailable,
+    PaymentDeclined,
+    get_payment_gateway,
+    requeue_stale_payments,
+    run_payment_attempt,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Charge payment attempts left pending, e.g. after a restart, or load "
+        "test the payment gateway"
+    )
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument("--workers", type=int, default=settings.PAYMENT_WORKERS)
+        parser.add_argument(
+            "--load-test",
+            type=int,
+            metavar="PAYMENTS",
+            help="Charge this many random cards with the configured gateway, "
+            "without touching the database, and report throughput and outcomes",
+        )
+
+    def handle(self, *args, **options) -> None:
+        if options["load_test"]:
+            self.load_test(options["load_test"], options["workers"])
+            return
+        before = timezone.now() - timedelta(
+            seconds=2 * settings.PAYMENT_GATEWAY_TIMEOUT
+        )
+        requeued = requeue_stale_payments(before)
+        pending = list(
+            PaymentAttempt.objects.filter(status=PaymentAttempt.PENDING)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            executor.map(run_payment_attempt, pending)
+        self.stdout.write(
+            f"Processed {len(pending)} payment attempts, {requeued} of them "
+            "interrupted before"
+        )
+
+    def load_test(self, size: int, workers: int) -> None:
+        gateway = get_payment_gateway()
+
+        def charge(number: int):
+            started = time.perf_counter()
+            card_number = str(random.randint(10**15, 10**16 - 1))
+            token = gateway.tokenize({"number": card_number})
+            try:
+                gateway.charge(token, Decimal("1.00"), reference=f"load-test-{number}")
+                outcome = "succeeded"
+            except PaymentDeclined:
+                outcome = "declined"
+            except GatewayUnavailable as error:
+                outcome = f"unavailable ({error})"
+            return outcome, time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(charge, range(size)))
+        elapsed = time.perf_counter() - started
+        latencies = sorted(latency for _, latency in results)
+        self.stdout.write(
+            f"{size} payments with {workers} workers in {elapsed:.2f}s "
+            f"({size / elapsed:.1f}/s)"
+        )
+        self.stdout.write(
+            f"Latency: median {statistics.median(latencies):.2f}s, "
+            f"p95 {latencies[int(0.95 * (size - 1))]:.2f}s, max {latencies[-1]:.2f}s"
+        )
+        for outcome, count in Counter(outcome for outcome, _ in results).most_common():
+            self.stdout.write(f"{outcome}: {count}")
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from orders.inventory import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = (
+        "Put the products of unpaid orders whose reservation expired back in "
+        "stock, e.g. every few minutes from cron"
+    )
+
+    def handle(self, *args, **options) -> None:
+        released = release_expired_reservations(timezone.now())
+        self.stdout.write(f"Released {released} orders")
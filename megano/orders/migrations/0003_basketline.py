@@ -0,0 +1,29 @@
+# Generated by Django 4.2.4 on 2026-10-18 13:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_sale_schedule'),
+        ('orders', '0002_order_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BasketLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_key', models.CharField(max_length=40)),
+                ('count', models.PositiveIntegerField(default=1)),
+                ('updated_at', models.DateTimeField(auto_now=True, db_index=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='basket_lines', to='products.product')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='basketline',
+            constraint=models.UniqueConstraint(fields=('session_key', 'product'), name='unique_basket_line'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 4.2.4 on 2026-10-18 13:13
+
+from django.db import migrations, models
+
+SNAPSHOT_FIELDS = (
+    "id", "category", "date", "title", "description", "freeDelivery", "images",
+    "tags", "rating",
+)
+
+
+def fill_snapshots(apps, schema_editor) -> None:
+    """Snapshot existing items from the current products, the best data left."""
+    OrderItem = apps.get_model("orders", "OrderItem")
+    ProductCard = apps.get_model("products", "ProductCard")
+    items = list(OrderItem.objects.select_related("product__sale").prefetch_related(
+        "product__images"
+    ))
+    cards = dict(
+        ProductCard.objects.filter(
+            product_id__in={item.product_id for item in items}
+        ).values_list("product_id", "data")
+    )
+    for item in items:
+        product = item.product
+        card = cards.get(product.id) or {
+            "id": product.id,
+            "category": product.category_id,
+            "title": product.title,
+            "description": (product.description or "")[:10],
+            "freeDelivery": product.freeDelivery,
+            "images": [
+                {"src": image.src.url, "alt": image.alt}
+                for image in product.images.all()
+            ],
+        }
+        item.price = product.price
+        item.on_sale = bool(product.sale and product.sale.active)
+        item.product_data = {field: card.get(field) for field in SNAPSHOT_FIELDS}
+        item.product_data["reviews"] = len(card.get("reviews") or [])
+    OrderItem.objects.bulk_update(
+        items, ["price", "on_sale", "product_data"], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_basketline'),
+        ('products', '0009_sale_schedule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='on_sale',
+            field=models.BooleanField(default=False, verbose_name='По акции'),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='price',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Цена за единицу'),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_data',
+            field=models.JSONField(default=dict),
+        ),
+        migrations.RunPython(fill_snapshots, migrations.RunPython.noop),
+    ]
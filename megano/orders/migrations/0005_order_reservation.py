@@ -0,0 +1,23 @@
+# Generated by Django 4.2.4 on 2026-10-18 13:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_orderitem_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='reserved_until',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='reserved',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.4 on 2026-10-18 13:18
+
+from django.db import migrations, models
+from django.db.models import Count, F, Max
+
+
+def drop_duplicate_open_orders(apps, schema_editor) -> None:
+    """Keep only the newest unpaid order of each profile and session.
+
+    Duplicates were created from the same basket by repeated requests. Stock
+    reserved for the dropped ones goes back to the products.
+    """
+    Order = apps.get_model("orders", "Order")
+    OrderItem = apps.get_model("orders", "OrderItem")
+    Product = apps.get_model("products", "Product")
+    for owner in ("profile", "session_id"):
+        duplicated = (
+            Order.objects.filter(paid=False, **{f"{owner}__isnull": False})
+            .values(owner)
+            .annotate(orders=Count("id"), newest=Max("id"))
+            .filter(orders__gt=1)
+        )
+        for row in duplicated:
+            dropped = Order.objects.filter(paid=False, **{owner: row[owner]}).exclude(
+                id=row["newest"]
+            )
+            for product_id, reserved in OrderItem.objects.filter(
+                order__in=dropped, reserved__gt=0
+            ).values_list("product_id", "reserved"):
+                Product.objects.filter(id=product_id).update(
+                    count=F("count") + reserved
+                )
+            dropped.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_order_reservation'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_open_orders, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.UniqueConstraint(condition=models.Q(('paid', False)), fields=('profile',), name='unique_open_order_per_profile'),
+        ),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.UniqueConstraint(condition=models.Q(('paid', False)), fields=('session_id',), name='unique_open_order_per_session'),
+        ),
+    ]
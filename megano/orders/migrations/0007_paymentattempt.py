@@ -0,0 +1,34 @@
+# Generated by Django 4.2.4 on 2026-10-18 13:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_open_order_constraints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentAttempt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Ожидает'), ('processing', 'Обрабатывается'), ('succeeded', 'Оплачен'), ('failed', 'Ошибка')], db_index=True, default='pending', max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('card_last4', models.CharField(max_length=4, verbose_name='Последние цифры карты')),
+                ('card_token', models.CharField(max_length=100)),
+                ('transaction_id', models.CharField(blank=True, max_length=100)),
+                ('error', models.CharField(blank=True, max_length=200)),
+                ('tries', models.PositiveSmallIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payment_attempts', to='orders.order')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='paymentattempt',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['pending', 'processing'])), fields=('order',), name='unique_active_payment_attempt'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.4 on 2026-10-18 13:34
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_paid_at(apps, schema_editor) -> None:
+    """Paid orders were last changed when they were paid."""
+    Order = apps.get_model("orders", "Order")
+    Order.objects.filter(paid=True).update(paid_at=F("updated_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_paymentattempt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='paid_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(fill_paid_at, migrations.RunPython.noop),
+    ]
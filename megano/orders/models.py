@@ -7,6 +7,7 @@ from users.models import Profile
 class Order(models.Model):
     createdAt = models.DateTimeField(auto_now_add=True)
     paid = models.BooleanField(default=False)
+    paid_at = models.DateTimeField(null=True, blank=True, db_index=True)
     profile = models.ForeignKey(
         Profile, null=True, blank=True, on_delete=models.DO_NOTHING
     )
@@ -27,6 +28,40 @@ class Order(models.Model):
     totalCost = models.DecimalField(
         max_digits=10, decimal_places=2, verbose_name="Цена заказа", default=0
     )
+    updated_at = models.DateTimeField(auto_now=True)
+    # Set while the products are taken from stock, see ``orders.inventory``
+    reserved_until = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        # An owner has at most one unpaid order, see ``orders.checkout.open_order``
+        constraints = [
+            models.UniqueConstraint(
+                fields=["profile"],
+                condition=models.Q(paid=False),
+                name="unique_open_order_per_profile",
+            ),
+            models.UniqueConstraint(
+                fields=["session_id"],
+                condition=models.Q(paid=False),
+                name="unique_open_order_per_session",
+            ),
+        ]
+
+    # Only changed with conditional UPDATEs, see ``orders.inventory``
+    GUARDED_FIELDS = ("reserved_until", "paid", "status", "paid_at")
+
+    def save(self, *args, **kwargs) -> None:
+        # Saving an order loaded before a concurrent reservation or payment
+        # does not overwrite what they wrote
+        if self.pk and not kwargs.get("force_insert") and not kwargs.get(
+            "update_fields"
+        ):
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.GUARDED_FIELDS
+            ]
+        super().save(*args, **kwargs)
 
 
 class OrderItem(models.Model):
@@ -41,3 +76,71 @@ class OrderItem(models.Model):
         related_name="order_item",
     )
     count = models.IntegerField(default=1)
+    price = models.DecimalField(
+        max_digits=10, decimal_places=2, verbose_name="Цена за единицу", default=0
+    )
+    on_sale = models.BooleanField(default=False, verbose_name="По акции")
+    # Product data as shown in the order, see ``orders.checkout.product_snapshot``
+    product_data = models.JSONField(default=dict)
+    # How many of the products are taken from stock for the order
+    reserved = models.PositiveIntegerField(default=0)
+
+
+class BasketLine(models.Model):
+    """A product in the basket of a session, see ``orders.cart``."""
+
+    session_key = models.CharField(max_length=40)
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="basket_lines"
+    )
+    count = models.PositiveIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["session_key", "product"], name="unique_basket_line"
+            )
+        ]
+
+
+class PaymentAttempt(models.Model):
+    """A payment of an order, charged in the background by ``orders.payments``."""
+
+    PENDING = "pending"
+    PROCESSING = "processing"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    STATUSES = [
+        (PENDING, "Ожидает"),
+        (PROCESSING, "Обрабатывается"),
+        (SUCCEEDED, "Оплачен"),
+        (FAILED, "Ошибка"),
+    ]
+    # Statuses of an attempt that may still charge the order
+    ACTIVE = [PENDING, PROCESSING]
+
+    order = models.ForeignKey(
+        Order, on_delete=models.CASCADE, related_name="payment_attempts"
+    )
+    status = models.CharField(
+        max_length=20, choices=STATUSES, default=PENDING, db_index=True
+    )
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    card_last4 = models.CharField(max_length=4, verbose_name="Последние цифры карты")
+    # Token issued by the payment gateway, the card number is never stored
+    card_token = models.CharField(max_length=100)
+    transaction_id = models.CharField(max_length=100, blank=True)
+    error = models.CharField(max_length=200, blank=True)
+    tries = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["order"],
+                condition=models.Q(status__in=["pending", "processing"]),
+                name="unique_active_payment_attempt",
+            )
+        ]
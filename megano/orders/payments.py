@@ -0,0 +1,195 @@
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+from functools import lru_cache
+from typing import Dict, Optional
+from uuid import uuid4
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.db.models.functions import Now
+from django.utils.module_loading import import_string
+
+from .inventory import (
+    InsufficientStock,
+    OrderChanged,
+    ReservationConflict,
+    pay_order,
+)
+from .models import Order, PaymentAttempt
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentDeclined(Exception):
+    """The gateway refused the payment, trying again will not help."""
+
+
+class GatewayUnavailable(Exception):
+    """The gateway failed or did not answer in time, the payment may be retried."""
+
+
+class BasePaymentGateway:
+    def tokenize(self, card: Dict[str, str]) -> str:
+        """Exchange the card data for a token to charge it later."""
+        raise NotImplementedError
+
+    def charge(self, token: str, amount: Decimal, reference: str) -> str:
+        """Charge the card and return the id of the transaction."""
+        raise NotImplementedError
+
+    def refund(self, transaction_id: str) -> None:
+        raise NotImplementedError
+
+
+class FakeGateway(BasePaymentGateway):
+    """A local gateway for development and offline load tests.
+
+    Cards with an even number that does not end in 0 are charged, others are
+    declined. Each charge takes a random time from ``FAKE_GATEWAY_LATENCY``,
+    times out past ``PAYMENT_GATEWAY_TIMEOUT`` and fails with the probability
+    ``FAKE_GATEWAY_FAILURE_RATE``.
+    """
+
+    def tokenize(self, card: Dict[str, str]) -> str:
+        return f"fake_{card['number'][-1]}_{uuid4().hex}"
+
+    def charge(self, token: str, amount: Decimal, reference: str) -> str:
+        latency = random.uniform(*settings.FAKE_GATEWAY_LATENCY)
+        time.sleep(min(latency, settings.PAYMENT_GATEWAY_TIMEOUT))
+        if latency > settings.PAYMENT_GATEWAY_TIMEOUT:
+            raise GatewayUnavailable("Платежная система не ответила")
+        if random.random() < settings.FAKE_GATEWAY_FAILURE_RATE:
+            raise GatewayUnavailable("Ошибка платежной системы")
+        last_digit = int(token.split("_")[1])
+        if last_digit % 2 or last_digit == 0:
+            raise PaymentDeclined("Оплата отклонена банком")
+        return f"fake_{uuid4().hex}"
+
+    def refund(self, transaction_id: str) -> None:
+        pass
+
+
+@lru_cache(maxsize=None)
+def get_payment_gateway() -> BasePaymentGateway:
+    return import_string(settings.PAYMENT_GATEWAY)()
+
+
+@lru_cache(maxsize=None)
+def get_payment_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(
+        max_workers=settings.PAYMENT_WORKERS, thread_name_prefix="payment"
+    )
+
+
+def enqueue_payment(attempt_id: int) -> None:
+    """Hand the attempt to the background workers once it is committed."""
+    transaction.on_commit(
+        lambda: get_payment_executor().submit(run_payment_attempt, attempt_id)
+    )
+
+
+def start_payment(order: Order, card: Dict[str, str]) -> PaymentAttempt:
+    """Record a payment attempt of the order and have it charged in the background.
+
+    An order has at most one pending attempt, which is returned instead of
+    starting another one.
+    """
+    try:
+        with transaction.atomic():
+            attempt = PaymentAttempt.objects.create(
+                order=order,
+                amount=order.totalCost,
+                card_last4=card["number"][-4:],
+                card_token=get_payment_gateway().tokenize(card),
+            )
+    except IntegrityError:
+        return PaymentAttempt.objects.get(
+            order=order,
+            status__in=PaymentAttempt.ACTIVE,
+        )
+    enqueue_payment(attempt.id)
+    return attempt
+
+
+def _finish(attempt: PaymentAttempt, status: str, **fields) -> str:
+    PaymentAttempt.objects.filter(id=attempt.id).update(
+        status=status, updated_at=Now(), **fields
+    )
+    # The order page shows the payment error
+    Order.objects.filter(id=attempt.order_id).update(updated_at=Now())
+    return status
+
+
+def process_payment_attempt(attempt_id: int) -> Optional[str]:
+    """Charge a pending attempt and pay its order, return the new status.
+
+    Returns None if another worker took the attempt. Attempts failing on the
+    gateway side go back to pending until ``PAYMENT_MAX_TRIES`` is reached. A
+    charge whose order can no longer be paid, or now costs another amount, is
+    refunded.
+    """
+    if not PaymentAttempt.objects.filter(
+        id=attempt_id, status=PaymentAttempt.PENDING
+    ).update(status=PaymentAttempt.PROCESSING, tries=F("tries") + 1, updated_at=Now()):
+        return None
+    attempt = PaymentAttempt.objects.select_related("order").get(id=attempt_id)
+    gateway = get_payment_gateway()
+    try:
+        transaction_id = gateway.charge(
+            attempt.card_token, attempt.amount, reference=str(attempt.id)
+        )
+    except GatewayUnavailable as error:
+        if attempt.tries < settings.PAYMENT_MAX_TRIES:
+            return _finish(attempt, PaymentAttempt.PENDING, error=str(error))
+        return _finish(attempt, PaymentAttempt.FAILED, error=str(error))
+    except PaymentDeclined as error:
+        return _finish(attempt, PaymentAttempt.FAILED, error=str(error))
+    try:
+        paid = pay_order(attempt.order, amount=attempt.amount)
+        error = "" if paid else "Заказ уже оплачен"
+    except InsufficientStock:
+        paid, error = False, "Недостаточно товара на складе"
+    except Order.DoesNotExist:
+        paid, error = False, "Заказ удален"
+    except OrderChanged:
+        paid, error = False, "Заказ изменился во время оплаты"
+    except ReservationConflict:
+        paid, error = False, "Не удалось зарезервировать товары заказа"
+    if not paid:
+        gateway.refund(transaction_id)
+        return _finish(
+            attempt, PaymentAttempt.FAILED, transaction_id=transaction_id, error=error
+        )
+    return _finish(
+        attempt, PaymentAttempt.SUCCEEDED, transaction_id=transaction_id, error=""
+    )
+
+
+def run_payment_attempt(attempt_id: int) -> None:
+    """Process the attempt in a worker thread, retrying gateway failures."""
+    try:
+        while process_payment_attempt(attempt_id) == PaymentAttempt.PENDING:
+            pass
+    except Exception:
+        logger.exception("Payment attempt %s failed", attempt_id)
+        PaymentAttempt.objects.filter(
+            id=attempt_id, status=PaymentAttempt.PROCESSING
+        ).update(status=PaymentAttempt.FAILED, error="Ошибка обработки платежа")
+    finally:
+        connection.close()
+
+
+def requeue_stale_payments(before: datetime) -> int:
+    """Return attempts left processing since ``before`` to pending.
+
+    Such attempts were interrupted, e.g. by a restart, as a charge cannot take
+    longer than the gateway timeout.
+    """
+    return PaymentAttempt.objects.filter(
+        status=PaymentAttempt.PROCESSING, updated_at__lt=before
+    ).update(status=PaymentAttempt.PENDING)
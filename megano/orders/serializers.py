@@ -1,8 +1,7 @@
 from typing import Dict, List
 
 from rest_framework import serializers as s
-from .models import Order, OrderItem
-from products.serializers import ProductSerializer
+from .models import Order, OrderItem, PaymentAttempt
 from users.serializers import ProfileSerializer
 
 
@@ -10,9 +9,7 @@ class OrderItemSerialize(s.ModelSerializer):
     product = s.SerializerMethodField()
 
     def get_product(self, obj: OrderItem) -> Dict:
-        data = ProductSerializer(obj.product).data
-        data["count"] = obj.count
-        return data
+        return {**obj.product_data, "price": str(obj.price), "count": obj.count}
 
     class Meta:
         model = OrderItem
@@ -26,24 +23,15 @@ class OrderSerializer(s.ModelSerializer):
     createdAt = s.SerializerMethodField()
 
     def get_products(self, obj: Order) -> List[Dict]:
-        order_items = OrderItem.objects.filter(order=obj).all()
-        data = []
-        for item in order_items:
-            serialized_item = (ProductSerializer(item.product)).data
-            serialized_item["count"] = item.count
-            data.append(serialized_item)
-        return data
+        """Products as they were when the order was placed, see ``OrderItem``."""
+        return [
+            OrderItemSerialize(item).data["product"]
+            for item in sorted(obj.order_item.all(), key=lambda item: item.id)
+        ]
 
     def get_createdAt(self, obj: Order) -> str:
         return obj.createdAt.strftime("%Y-%m-%d%H:%M:%S")
 
-    def get_totalCost(self, obj: Order) -> float:
-        items = OrderItem.objects.filter(order=obj).all()
-        total_price = 0
-        for el in items:
-            total_price += el.product.price * el.count
-        return float(total_price)
-
     def get_orderId(self, obj: Order) -> int:
         return obj.id
 
@@ -62,3 +50,33 @@ class OrderSerializer(s.ModelSerializer):
             "orderId",
             "profile",
         ]
+
+
+class OrderSummarySerializer(OrderSerializer):
+    """An order without its products and profile, for the order history list."""
+
+    class Meta(OrderSerializer.Meta):
+        fields = [
+            field
+            for field in OrderSerializer.Meta.fields
+            if field not in ("products", "profile")
+        ]
+
+
+class PaymentSerializer(s.Serializer):
+    """Card data of a payment, as sent by the payment page."""
+
+    number = s.RegexField(r"^\d{1,19}$")
+    name = s.CharField(max_length=100)
+    month = s.RegexField(r"^(0?[1-9]|1[0-2])$")
+    year = s.RegexField(r"^\d{2,4}$")
+    code = s.RegexField(r"^\d{3}$")
+
+
+class PaymentAttemptSerializer(s.ModelSerializer):
+    createdAt = s.DateTimeField(source="created_at")
+    updatedAt = s.DateTimeField(source="updated_at")
+
+    class Meta:
+        model = PaymentAttempt
+        fields = ["id", "order", "status", "error", "amount", "createdAt", "updatedAt"]
@@ -1,3 +1,296 @@
-from django.test import TestCase
+import threading
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+
+from products.models import Product
+
+from .cart import CacheBasketStore, DatabaseBasketStore
+from .inventory import (
+    PAY_ORDER_TRIES,
+    InsufficientStock,
+    ReservationConflict,
+    pay_order,
+    release_order,
+    reserve_order,
+)
+from .models import Order, OrderItem, PaymentAttempt
+from .payments import process_payment_attempt
+
+
+def make_order(product: Product, count: int, session_id: str) -> Order:
+    order = Order.objects.create(session_id=session_id)
+    OrderItem.objects.create(
+        order=order, product=product, count=count, product_data={"title": "Test"}
+    )
+    return order
+
+
+def run_in_threads(func, args_list):
+    """Call ``func`` with each of the args at once, return results or errors."""
+    barrier = threading.Barrier(len(args_list))
+    results = [None] * len(args_list)
+
+    def run(index, args):
+        try:
+            barrier.wait()
+            results[index] = func(*args)
+        except Exception as error:
+            results[index] = error
+        finally:
+            connection.close()
+
+    threads = [
+        threading.Thread(target=run, args=(index, args))
+        for index, args in enumerate(args_list)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class PayOrderThreadTests(TransactionTestCase):
+    """Concurrent payments on the configured database (SQLite or PostgreSQL)."""
+
+    def setUp(self) -> None:
+        self.product = Product.objects.create(
+            title="Test", description="Test", price=10, base_price=10, count=5
+        )
+
+    def test_order_is_paid_once(self) -> None:
+        order = make_order(self.product, 2, "session")
+        results = run_in_threads(
+            lambda: pay_order(Order.objects.get(pk=order.pk)), [()] * 4
+        )
+        self.assertEqual(sorted(results), [False, False, False, True])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.count, 3)
+
+    def test_stock_is_not_oversold(self) -> None:
+        orders = [make_order(self.product, 2, f"session {i}") for i in range(3)]
+        results = run_in_threads(pay_order, [(order,) for order in orders])
+        self.assertEqual(results.count(True), 2)
+        self.assertEqual(
+            [type(result) for result in results if result is not True],
+            [InsufficientStock],
+        )
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.count, 1)
+
+    def test_paying_a_deleted_order_fails(self) -> None:
+        order = make_order(self.product, 2, "session")
+        Order.objects.filter(pk=order.pk).delete()
+        with self.assertRaises(Order.DoesNotExist):
+            pay_order(order)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.count, 5)
+
+
+class PayOrderReadCommittedTests(TestCase):
+    """Interleavings seen on PostgreSQL, where a reservation released by another
+    transaction between reserving and paying becomes visible under READ COMMITTED.
+    """
+
+    def setUp(self) -> None:
+        self.product = Product.objects.create(
+            title="Test", description="Test", price=10, base_price=10, count=5
+        )
+        self.order = make_order(self.product, 2, "session")
+
+    def reserve_then_release(self, releases: int):
+        calls = []
+
+        def reserve(order: Order) -> bool:
+            calls.append(order.pk)
+            reserved = reserve_order(order)
+            if len(calls) <= releases:
+                release_order(order)
+            return reserved
+
+        return calls, mock.patch("orders.inventory.reserve_order", reserve)
+
+    def test_released_reservation_is_made_again(self) -> None:
+        calls, patch = self.reserve_then_release(releases=1)
+        with patch:
+            self.assertTrue(pay_order(self.order))
+        self.assertEqual(len(calls), 2)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.count, 3)
+
+    def test_retries_are_bounded(self) -> None:
+        calls, patch = self.reserve_then_release(releases=PAY_ORDER_TRIES)
+        with patch, self.assertRaises(ReservationConflict):
+            pay_order(self.order)
+        self.assertEqual(len(calls), PAY_ORDER_TRIES)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.count, 5)
+
+    def test_stale_save_keeps_the_payment(self) -> None:
+        stale = Order.objects.get(pk=self.order.pk)
+        self.assertTrue(pay_order(self.order))
+        stale.city = "X"
+        stale.save()
+        order = Order.objects.get(pk=self.order.pk)
+        self.assertEqual(order.city, "X")
+        self.assertEqual((order.paid, order.status), (True, "Paid"))
+        self.assertIsNotNone(order.paid_at)
+        self.assertIsNotNone(order.reserved_until)
+
+    def test_paid_order_is_not_reserved_again(self) -> None:
+        self.assertTrue(pay_order(self.order))
+        Order.objects.filter(pk=self.order.pk).update(reserved_until=None)
+        self.assertFalse(reserve_order(self.order))
+        self.assertFalse(pay_order(self.order))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.count, 3)
+
+
+class PaymentInProgressTests(TestCase):
+    """An order cannot change once a payment of it has started."""
+
+    card = {"number": "4242", "name": "Test", "month": "1", "year": "30", "code": "123"}
+
+    def setUp(self) -> None:
+        self.products = [
+            Product.objects.create(
+                title=f"Test {i}",
+                description="Test",
+                price=10 * i,
+                base_price=10 * i,
+                count=5,
+            )
+            for i in (1, 2)
+        ]
+        self.client = APIClient()
+        self.client.post(
+            "/api/basket", {"id": self.products[0].id, "count": 1}, format="json"
+        )
+        self.order_id = self.client.post("/api/orders", format="json").data["id"]
+        response = self.client.post(
+            f"/api/payment/{self.order_id}", self.card, format="json"
+        )
+        self.assertEqual(response.status_code, 202)
+        self.attempt_id = response.data["id"]
+
+    def test_order_items_cannot_change(self) -> None:
+        self.client.post(
+            "/api/basket", {"id": self.products[1].id, "count": 3}, format="json"
+        )
+        response = self.client.post("/api/orders", format="json")
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(
+            list(
+                OrderItem.objects.filter(order_id=self.order_id).values_list(
+                    "product_id", "count"
+                )
+            ),
+            [(self.products[0].id, 1)],
+        )
+        self.assertIsNotNone(Order.objects.get(pk=self.order_id).reserved_until)
+
+    def process(self) -> mock.Mock:
+        gateway = mock.Mock()
+        gateway.charge.return_value = "transaction"
+        with mock.patch("orders.payments.get_payment_gateway", return_value=gateway):
+            self.status = process_payment_attempt(self.attempt_id)
+        return gateway
+
+    def test_unchanged_order_is_paid(self) -> None:
+        gateway = self.process()
+        self.assertEqual(self.status, PaymentAttempt.SUCCEEDED)
+        gateway.refund.assert_not_called()
+        self.assertTrue(Order.objects.get(pk=self.order_id).paid)
+
+    def test_changed_order_is_refunded(self) -> None:
+        Order.objects.filter(pk=self.order_id).update(totalCost=70)
+        gateway = self.process()
+        self.assertEqual(self.status, PaymentAttempt.FAILED)
+        gateway.refund.assert_called_once_with("transaction")
+        self.assertFalse(Order.objects.get(pk=self.order_id).paid)
+
+
+class BasketStoreTests:
+    store_class = None
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.store = self.store_class()
+        self.products = [
+            Product.objects.create(
+                title=f"Test {i}", description="Test", price=10, base_price=10
+            ).id
+            for i in range(3)
+        ]
+
+    def test_add(self) -> None:
+        self.store.add("key", self.products[0], 2)
+        self.store.add("key", self.products[0], 1)
+        self.store.add("key", self.products[1], 1)
+        self.assertEqual(
+            self.store.lines("key"), {self.products[0]: 3, self.products[1]: 1}
+        )
+        self.assertEqual(self.store.lines("other"), {})
+
+    def test_add_many(self) -> None:
+        self.store.add("key", self.products[0], 1)
+        self.store.add_many("key", {self.products[0]: 2, self.products[1]: 4})
+        self.assertEqual(
+            self.store.lines("key"), {self.products[0]: 3, self.products[1]: 4}
+        )
+
+    def test_remove(self) -> None:
+        self.store.add_many("key", {self.products[0]: 3, self.products[1]: 1})
+        self.store.remove("key", self.products[0], 2)
+        self.store.remove("key", self.products[1], 5)
+        self.store.remove("key", self.products[2], 1)
+        self.assertEqual(self.store.lines("key"), {self.products[0]: 1})
+
+    def test_merge(self) -> None:
+        self.store.add_many("source", {self.products[0]: 1, self.products[1]: 2})
+        self.store.add_many("target", {self.products[1]: 3, self.products[2]: 1})
+        self.store.merge("source", "target")
+        self.assertEqual(self.store.lines("source"), {})
+        self.assertEqual(
+            self.store.lines("target"),
+            {self.products[0]: 1, self.products[1]: 5, self.products[2]: 1},
+        )
+
+
+class DatabaseBasketStoreTests(BasketStoreTests, TestCase):
+    store_class = DatabaseBasketStore
+
+
+class CacheBasketStoreTests(BasketStoreTests, TestCase):
+    store_class = CacheBasketStore
+
+
+class BasketViewTests(TestCase):
+    def setUp(self) -> None:
+        self.product = Product.objects.create(
+            title="Test", description="Test", price=10, base_price=10, count=5
+        )
+        self.client = APIClient()
+
+    def test_invalid_lines_are_rejected(self) -> None:
+        self.client.post("/api/basket", {"id": self.product.id}, format="json")
+        for data in (
+            {},
+            {"id": "x"},
+            {"id": self.product.id, "count": "x"},
+            {"id": self.product.id, "count": 0},
+            {"id": self.product.id, "count": -5},
+        ):
+            for method in (self.client.post, self.client.delete):
+                response = method("/api/basket", data, format="json")
+                self.assertEqual(response.status_code, 400, (method, data))
+        response = self.client.get("/api/basket")
+        self.assertEqual([card["count"] for card in response.data], [1])
+
+    def test_unknown_product_is_not_found(self) -> None:
+        response = self.client.post("/api/basket", {"id": 999999}, format="json")
+        self.assertEqual(response.status_code, 404)
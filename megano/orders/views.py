@@ -1,60 +1,111 @@
+import hashlib
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import QuerySet
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from products.serializers import ProductSerializer
-from users.models import Profile
-
-from .models import Order, OrderItem
+from .models import Order, PaymentAttempt
 from .cart import Basket
+from .checkout import PaymentInProgress, open_order, sync_order_items
+from .payments import start_payment
+from .idempotency import idempotent
+from .inventory import InsufficientStock, reserve_order
 from products.models import Product
-
-from .serializers import OrderSerializer
+from products.pagination import KeysetPagination
+
+from .serializers import (
+    OrderSerializer,
+    OrderSummarySerializer,
+    PaymentAttemptSerializer,
+    PaymentSerializer,
+)
 from users.serializers import ProfileSerializer
 
 
-class OrderView(APIView):
+def history(orders: QuerySet[Order]) -> QuerySet[Order]:
+    """Orders with what their serializer reads, fetched in a fixed number of queries."""
+    return orders.select_related("profile__avatar").prefetch_related("order_item")
+
+
+def order_state(pk: int) -> Optional[dict]:
+    # Order items keep their own product data, so only the order and the
+    # profile shown with it change the response
+    return (
+        Order.objects.filter(pk=pk)
+        .values(
+            "updated_at",
+            "profile__fullName",
+            "profile__email",
+            "profile__phone",
+            "profile__avatar__src",
+            "profile__avatar__alt",
+        )
+        .first()
+    )
+
+
+def order_last_modified(request: Request, pk: int) -> Optional[datetime]:
+    state = order_state(pk)
+    if state is None:
+        return None
+    return state["updated_at"]
+
+
+def order_etag(request: Request, pk: int) -> Optional[str]:
+    state = order_state(pk)
+    if state is None:
+        return None
+    raw = json.dumps([pk, state], cls=DjangoJSONEncoder, sort_keys=True)
+    return "order:" + hashlib.md5(raw.encode()).hexdigest()
+
+
+class OrderView(APIView, KeysetPagination):
+    page_size = 10
+    page_size_query_param = "limit"
+    max_page_size = 50
+
+    @idempotent
     def post(self, request: Request) -> Response:
-        if request.user.is_authenticated:
-            profile = Profile.objects.filter(user=request.user).first()
-            order = Order.objects.filter(profile=profile, paid=False).first()
-            if not order:
-                order = Order.objects.create(profile=profile)
-                order.profile = profile
-        else:
-            order = Order.objects.filter(
-                session_id=request.session.session_key, paid=False
-            ).first()
-            if not order:
-                order = Order.objects.create(session_id=request.session.session_key)
-
-        if order.updated:
-            basket = Basket(request)
-            OrderItem.objects.filter(order=order).all().delete()
-            products = Product.objects.filter(id__in=basket.basket.keys()).all()
-            if products:
-                order.totalCost = sum(
-                    (
-                        el.product.price * el.count if not el.product.sale else
-                        el.product.price
-                        for el in [
-                            OrderItem.objects.create(
-                                order=order,
-                                product=product,
-                                count=basket.basket.get(str(product.id))["count"],
-                            )
-                            for product in products
-                        ]
-                    )
-                )
-            order.updated = False
-        order.save()
+        try:
+            with transaction.atomic():
+                order = open_order(request)
+                if order.updated:
+                    sync_order_items(order, Basket(request).lines())
+                else:
+                    order.save()
+        except PaymentInProgress:
+            return Response(data={"detail": "Заказ уже оплачивается"}, status=409)
         return Response(data=OrderSerializer(order).data, status=200)
 
     def get(self, request: Request) -> Response:
-        orders = Order.objects.filter(profile__user_id=request.user.id).all()
+        """Orders of the user.
+
+        With the ``cursor`` query parameter (empty for the first page) they
+        come newest first in pages of ``limit`` with the cursor of the next
+        page. ``summary`` leaves out their products and profile.
+        """
+        orders = Order.objects.filter(profile__user_id=request.user.id)
+        summary = "summary" in request.query_params
+        serializer_class = OrderSummarySerializer if summary else OrderSerializer
+        if not summary:
+            orders = history(orders)
+        if self.is_keyset_request(request):
+            page = self.paginate_keyset(orders, request, "createdAt", descending=True)
+            data = {
+                "items": serializer_class(page, many=True).data,
+                "nextCursor": self.next_cursor,
+            }
+            return Response(data=data, status=200)
         if orders:
-            return Response(data=OrderSerializer(orders, many=True).data, status=200)
+            return Response(data=serializer_class(orders, many=True).data, status=200)
         return Response(status=404)
 
 
@@ -71,61 +122,106 @@ class OrderDetailedView(APIView):
         order.city = request.data["city"]
         order.address = request.data["address"]
         order.save()
+        try:
+            reserve_order(order)
+        except InsufficientStock as error:
+            return Response(data={"shortages": error.shortages}, status=409)
         return Response(data=OrderSerializer(order).data, status=200)
 
+    @method_decorator(
+        condition(etag_func=order_etag, last_modified_func=order_last_modified)
+    )
     def get(self, request: Request, pk: int) -> Response:
-        order = Order.objects.filter(pk=pk).first()
+        order = history(Order.objects.filter(pk=pk)).first()
 
         if not order:
             return Response(status=404)
         data = OrderSerializer(order).data
         data.update(**ProfileSerializer(order.profile).data)
+        payment = order.payment_attempts.order_by("-id").first()
+        if payment and payment.status == PaymentAttempt.FAILED:
+            data["paymentError"] = payment.error
         return Response(data=data, status=200)
 
 
 class BasketView(APIView):
     def set_update_order_status(self, request: Request) -> None:
         if request.user.is_authenticated:
-            order = Order.objects.filter(profile__user=request.user, paid=False).first()
+            orders = Order.objects.filter(profile__user=request.user, paid=False)
         else:
-            order = Order.objects.filter(
+            orders = Order.objects.filter(
                 session_id=request.session.session_key, paid=False
-            ).first()
-        if order:
-            order.updated = True
-            order.save()
+            )
+        orders.update(updated=True)
+
+    @staticmethod
+    def basket_line(request: Request) -> Optional[Tuple[int, int]]:
+        """Return the product id and the count of the request, None if invalid."""
+        try:
+            product_id = int(request.data.get("id"))
+            count = int(request.data.get("count", 1))
+        except (TypeError, ValueError):
+            return None
+        if count < 1:
+            return None
+        return product_id, count
 
     def get(self, request: Request) -> Response:
         basket = Basket(request)
-        return Response(basket.basket.values(), status=200)
+        return Response(basket.products(), status=200)
 
     def post(self, request: Request) -> Response:
-        product_id = request.data.get("id")
-        quantity = int(request.data.get("count", 1))
+        line = self.basket_line(request)
+        if line is None:
+            return Response(status=400)
+        product_id, quantity = line
         product = Product.objects.filter(id=product_id).first()
         if not product:
             return Response(status=404)
         basket = Basket(request)
         basket.add(product, quantity)
         self.set_update_order_status(request)
-        return Response(basket.basket.values(), status=200)
+        return Response(basket.products(), status=200)
 
     def delete(self, request: Request) -> Response:
+        line = self.basket_line(request)
+        if line is None:
+            return Response(status=400)
+        product_id, count = line
         basket = Basket(request)
-        count = request.data.get("count", 1)
-        basket.remove(request.data.get("id"), count)
+        basket.remove(product_id, count)
         self.set_update_order_status(request)
-        return Response(basket.basket.values(), status=200)
+        return Response(basket.products(), status=200)
 
 
 class PaymentView(APIView):
+    @idempotent
     def post(self, request: Request, pk) -> Response:
-        basket = Basket(request)
-        basket.clear()
+        """Start paying the order, answered before the card is charged.
+
+        The payment is charged in the background, its progress is read with
+        GET on the same URL.
+        """
         order = Order.objects.filter(pk=pk).first()
-        if order:
-            order.paid = True
-            order.status = "Paid"
-            order.save()
-            return Response(status=200)
-        return Response(status=400)
+        if not order:
+            return Response(status=400)
+        if order.paid:
+            latest = order.payment_attempts.order_by("-id").first()
+            data = PaymentAttemptSerializer(latest).data if latest else None
+            return Response(data=data, status=200)
+        card = PaymentSerializer(data=request.data)
+        card.is_valid(raise_exception=True)
+        try:
+            with transaction.atomic():
+                reserve_order(order)
+                attempt = start_payment(order, card.validated_data)
+        except InsufficientStock as error:
+            return Response(data={"shortages": error.shortages}, status=409)
+        Basket(request).clear()
+        return Response(data=PaymentAttemptSerializer(attempt).data, status=202)
+
+    def get(self, request: Request, pk) -> Response:
+        attempt = PaymentAttempt.objects.filter(order_id=pk).order_by("-id").first()
+        if not attempt:
+            return Response(status=404)
+        return Response(data=PaymentAttemptSerializer(attempt).data, status=200)
@@ -1,12 +1,23 @@
-from typing import List
+from typing import Iterable, List, Optional
 
 from django.contrib import admin
 from django.core.handlers.wsgi import WSGIRequest
-from django.http import HttpRequest, HttpResponse, HttpResponseRedirect
+from django.db.models import Count, QuerySet, Sum
+from django.http import (
+    Http404,
+    HttpRequest,
+    HttpResponse,
+    HttpResponseRedirect,
+    JsonResponse,
+)
 from django.shortcuts import render
 from django.template.response import TemplateResponse
-from django.urls import path
+from django.urls import path, reverse
+from django.utils.html import format_html
 from .forms import AddProductsToSaleForm, AddProduct
+from .jobs import job_status, start_job
+from .reviews import update_review_stats
+from .sales import BACKGROUND_THRESHOLD, assign_sale
 from .models import (
     Category,
     CategoryImage,
@@ -19,6 +30,28 @@ from .models import (
 )
 
 
+def assign_products(
+    model_admin: admin.ModelAdmin,
+    request: WSGIRequest,
+    product_ids: Iterable[int],
+    sale: Optional[Sale],
+) -> None:
+    """Put the products on the sale, in a background job for large selections."""
+    product_ids = [int(pk) for pk in product_ids]
+    if len(product_ids) <= BACKGROUND_THRESHOLD:
+        assign_sale(product_ids, sale)
+        return
+    job_id = start_job("assign sale", len(product_ids), assign_sale, product_ids, sale)
+    model_admin.message_user(
+        request,
+        format_html(
+            'Updating {} products in the background, <a href="{}">progress</a>',
+            len(product_ids),
+            reverse("admin:sale_job_status", args=[job_id]),
+        ),
+    )
+
+
 class ProductImageInLine(admin.TabularInline):
     model = ProductImage
 
@@ -74,34 +107,24 @@ class SaleAdmin(admin.ModelAdmin):
     def get_urls(self) -> List[path]:
         urls = super().get_urls()
         new_urls = [
-            path("add_product", self.add_products_to_sale, name="add_products_to_sale")
+            path("add_product", self.add_products_to_sale, name="add_products_to_sale"),
+            path(
+                "job/<str:job_id>",
+                self.admin_site.admin_view(self.job_status),
+                name="sale_job_status",
+            ),
         ]
 
         return new_urls + urls
 
     def response_change(self, request: WSGIRequest, obj: Sale):
-        for el in request.POST.getlist("add product"):
-            product = Product.objects.filter(id=el).first()
-            if product:
-                product.sale = obj
-                Product.make_sale_price(product)
-                product.save()
-        for el in request.POST.getlist("delete product"):
-
-            product = Product.objects.get(id=el)
-            Product.return_origin_price(product)
-            product.sale = None
-            product.save()
+        assign_products(self, request, request.POST.getlist("add product"), obj)
+        assign_products(self, request, request.POST.getlist("delete product"), None)
 
         return super().response_change(request, obj)
 
     def response_add(self, request: WSGIRequest, obj: Sale, post_url_continue=None) -> HttpResponse:  # Here
-
-        for el in request.POST.getlist("add product"):
-            product = Product.objects.filter(id=el).first()
-            if product:
-                product.sale = obj
-                product.save()
+        assign_products(self, request, request.POST.getlist("add product"), obj)
         return super().response_add(request, obj, post_url_continue)
 
     def add_products_to_sale(self, request: WSGIRequest) -> HttpResponse:
@@ -110,33 +133,39 @@ class SaleAdmin(admin.ModelAdmin):
         else:
             form = AddProductsToSaleForm(request.POST)
             if form.is_valid():
-                products = Product.objects.filter(id__in=form.data.getlist("products"))
                 sale = Sale.objects.get(id=int(form.data["sales"]))
-                for product in products:
-                    product.sale = sale
-                    product.save()
+                assign_products(self, request, form.data.getlist("products"), sale)
                 return HttpResponseRedirect("/admin/products/sale/")
             else:
                 raise ValueError
         context = {"form": form}
         return render(request, "admin/add_product_to_sale.html", context)
 
+    def job_status(self, request: WSGIRequest, job_id: str) -> JsonResponse:
+        status = job_status(job_id)
+        if status is None:
+            raise Http404
+        return JsonResponse(status)
+
 
 @admin.action(description="Delete sale from selected products")
 def delete_sale(ProductAdmin, request, queryset):
-    for el in queryset:
-        el.sale = None
-        el.save()
+    assign_products(
+        ProductAdmin, request, queryset.values_list("id", flat=True), None
+    )
 
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
     inlines = [ProductImageInLine, SpecificationInLine]
     actions = [delete_sale]
+    # Review totals are kept by products.reviews with F() updates
+    readonly_fields = ("price", "reviews_count", "rating_sum", "rating")
 
     list_display = (
         "title",
         "category",
+        "base_price",
         "price",
         "count",
         "description",
@@ -145,6 +174,12 @@ class ProductAdmin(admin.ModelAdmin):
         "sale",
     )
 
+    def get_form(self, request: WSGIRequest, obj=None, **kwargs):
+        # The price is derived from the base price, so it cannot be left blank
+        form = super().get_form(request, obj, **kwargs)
+        form.base_fields["base_price"].required = True
+        return form
+
 
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
@@ -159,3 +194,27 @@ class ProductImageAdmin(admin.ModelAdmin):
 @admin.register(Review)
 class ReviewAdmin(admin.ModelAdmin):
     list_display = "author", "email", "rate", "date", "text", "product", "is_checked"
+
+    def save_model(self, request: WSGIRequest, obj: Review, form, change: bool) -> None:
+        if change:
+            old = Review.objects.get(pk=obj.pk)
+            if old.is_checked:
+                update_review_stats(old.product_id, -old.rate, -1)
+        if obj.is_checked:
+            update_review_stats(obj.product_id, obj.rate, 1)
+        super().save_model(request, obj, form, change)
+
+    def delete_model(self, request: WSGIRequest, obj: Review) -> None:
+        if obj.is_checked:
+            update_review_stats(obj.product_id, -obj.rate, -1)
+        super().delete_model(request, obj)
+
+    def delete_queryset(self, request: WSGIRequest, queryset: QuerySet) -> None:
+        stats = (
+            queryset.filter(is_checked=True)
+            .values("product_id")
+            .annotate(count=Count("id"), rate=Sum("rate"))
+        )
+        for row in stats:
+            update_review_stats(row["product_id"], -row["rate"], -row["count"])
+        super().delete_queryset(request, queryset)
@@ -0,0 +1,115 @@
+import math
+import random
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import (
+    Case,
+    Count,
+    F,
+    IntegerField,
+    Max,
+    Min,
+    QuerySet,
+    Value,
+    When,
+)
+
+from .cache import get_versions
+from .cards import card_rows, product_cards
+from .models import Product
+
+BANNER_SIZE = 5
+SALE_WEIGHT = 3
+MAX_ROUNDS = 8
+MAX_CANDIDATES = 500
+
+WEIGHTS = {
+    None: Value(1),
+    "stock": F("count"),
+    "sale": Case(
+        When(sale__isnull=False, then=Value(SALE_WEIGHT)),
+        default=Value(1),
+        output_field=IntegerField(),
+    ),
+}
+
+
+def eligible_products() -> QuerySet[Product]:
+    """Products that may be shown on a banner, annotated with ``banner_weight``.
+
+    ``BANNER_WEIGHTING`` picks the weight: ``None`` draws uniformly, ``"stock"``
+    by the count in stock and ``"sale"`` favours products on sale.
+    """
+    weight = WEIGHTS[getattr(settings, "BANNER_WEIGHTING", None)]
+    return Product.objects.annotate(banner_weight=weight).filter(banner_weight__gt=0)
+
+
+def banner_bounds() -> Optional[Tuple[int, int, int, int]]:
+    """Return (min id, max id, count, max weight) of the eligible products.
+
+    The bounds are cached until a product changes.
+    """
+    version = get_versions(["products"])["products"]
+    weighting = getattr(settings, "BANNER_WEIGHTING", None)
+    key = f"banner-bounds:{weighting}:{version}"
+    bounds = cache.get(key)
+    if bounds is None:
+        stats = eligible_products().aggregate(
+            low=Min("id"), high=Max("id"), total=Count("id"), weight=Max("banner_weight")
+        )
+        bounds = (stats["low"], stats["high"], stats["total"], stats["weight"])
+        cache.set(key, bounds, None)
+    return bounds if bounds[2] else None
+
+
+def sample_banner_products(size: int = BANNER_SIZE) -> List[Dict]:
+    """Draw up to ``size`` distinct product cards at random.
+
+    Ids are drawn uniformly from the id range and looked up by primary key, so
+    the cost does not depend on the catalog size. Gaps in the range and the
+    weights are handled by rejection: a drawn product is kept with probability
+    ``weight / max weight``.
+    """
+    bounds = banner_bounds()
+    if bounds is None:
+        return []
+    low, high, total, max_weight = bounds
+    queryset = eligible_products()
+    if total <= size:
+        rows = list(card_rows(queryset))
+        random.shuffle(rows)
+        return product_cards(rows)
+
+    chosen = {}
+    density = total / (high - low + 1)
+    for _ in range(MAX_ROUNDS):
+        missing = size - len(chosen)
+        if missing <= 0:
+            break
+        candidates = min(MAX_CANDIDATES, math.ceil(2 * missing / density))
+        drawn = {random.randint(low, high) for _ in range(candidates)} - chosen.keys()
+        rows = list(
+            queryset.filter(id__in=drawn).values_list(
+                "id", "card__data", "banner_weight"
+            )
+        )
+        random.shuffle(rows)
+        for pk, data, weight in rows:
+            if len(chosen) < size and random.random() * max_weight < weight:
+                chosen[pk] = data
+
+    missing = size - len(chosen)
+    if missing > 0:
+        # Very sparse id ranges or skewed weights: seek from a random id.
+        start = random.randint(low, high)
+        rest = queryset.exclude(id__in=chosen.keys()).order_by("id")
+        rows = list(card_rows(rest.filter(id__gte=start))[:missing])
+        if len(rows) < missing:
+            rows += card_rows(rest.filter(id__lt=start))[: missing - len(rows)]
+        chosen.update(rows)
+
+    rows = list(chosen.items())
+    random.shuffle(rows)
+    return product_cards(rows)
@@ -0,0 +1,34 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db.models import QuerySet
+
+from .models import Product, ProductCard
+from .serializers import ProductSerializer
+
+
+def refresh_product_cards(product_ids: Iterable[int]) -> Dict[int, Dict]:
+    """Rebuild the cards of the given products and return them by product id."""
+    products = list(Product.objects.filter(id__in=list(product_ids)))
+    serialized = ProductSerializer(products, many=True).data
+    cards = {product.id: data for product, data in zip(products, serialized)}
+    ProductCard.objects.bulk_create(
+        [ProductCard(product_id=pk, data=data) for pk, data in cards.items()],
+        update_conflicts=True,
+        unique_fields=["product"],
+        update_fields=["data"],
+    )
+    return cards
+
+
+def card_rows(queryset: QuerySet[Product]) -> QuerySet:
+    """Turn a product queryset into (id, card) rows fetched with a single join."""
+    return queryset.values_list("id", "card__data")
+
+
+def product_cards(rows: Iterable[Tuple[int, Optional[Dict]]]) -> List[Dict]:
+    """Return the cards of the rows, building the ones that are not stored yet."""
+    rows = list(rows)
+    missing = [pk for pk, data in rows if data is None]
+    built = refresh_product_cards(missing) if missing else {}
+    cards = [data if data is not None else built.get(pk) for pk, data in rows]
+    return [card for card in cards if card is not None]
@@ -0,0 +1,101 @@
+from typing import Dict, Iterable, List
+
+from django.db.models import Count, Max, Min, Q, QuerySet
+
+from .models import CategoryClosure, Product, ProductTag
+
+PRICE_BUCKETS = (0, 1000, 5000, 10000, 20000, 50000, 100000)
+
+
+def refresh_product_tags(product_ids: Iterable[int]) -> None:
+    """Rebuild the tag facet rows of the given products from their categories."""
+    product_ids = list(product_ids)
+    ProductTag.objects.filter(product_id__in=product_ids).delete()
+    rows = set(
+        Product.objects.filter(
+            id__in=product_ids,
+            category__ancestor_links__ancestor__tags__isnull=False,
+        ).values_list("id", "category__ancestor_links__ancestor__tags")
+    )
+    ProductTag.objects.bulk_create(
+        [ProductTag(product_id=product_id, tag_id=tag_id) for product_id, tag_id in rows]
+    )
+
+
+def filter_by_tags(queryset: QuerySet[Product], tag_ids: List) -> QuerySet[Product]:
+    """Keep the products carrying any of the tags."""
+    return queryset.filter(
+        id__in=ProductTag.objects.filter(tag_id__in=tag_ids).values("product_id")
+    )
+
+
+def price_buckets() -> List[Dict]:
+    bounds = list(PRICE_BUCKETS) + [None]
+    return [{"from": low, "to": high} for low, high in zip(bounds, bounds[1:])]
+
+
+def catalog_facets(
+    queryset: QuerySet[Product],
+    untagged_queryset: QuerySet[Product],
+    unpriced_queryset: QuerySet[Product],
+) -> Dict:
+    """Count the facets of a catalog result set.
+
+    Tag counts are taken from ``untagged_queryset`` (the result set without the
+    tag filter) so that selecting a tag does not hide the alternatives. For
+    the same reason the price range comes from ``unpriced_queryset``, the
+    result set without the price filter.
+    """
+    buckets = price_buckets()
+    aggregates = {
+        "total": Count("id"),
+        "freeDelivery": Count("id", filter=Q(freeDelivery=True)),
+        "available": Count("id", filter=Q(count__gt=0)),
+    }
+    for number, bucket in enumerate(buckets):
+        bucket_filter = Q(price__gte=bucket["from"])
+        if bucket["to"] is not None:
+            bucket_filter &= Q(price__lt=bucket["to"])
+        aggregates[f"bucket_{number}"] = Count("id", filter=bucket_filter)
+    counts = queryset.order_by().aggregate(**aggregates)
+    for number, bucket in enumerate(buckets):
+        bucket["count"] = counts.pop(f"bucket_{number}")
+    prices = unpriced_queryset.order_by().aggregate(
+        minPrice=Min("price"), maxPrice=Max("price")
+    )
+
+    tags = (
+        ProductTag.objects.filter(product__in=untagged_queryset.order_by().values("id"))
+        .values("tag_id", "tag__name")
+        .annotate(count=Count("product_id"))
+        .order_by("tag_id")
+    )
+
+    # A fresh closure query, as the category filter of ``queryset`` joins the
+    # closure too and would keep only the selected category
+    categories = (
+        CategoryClosure.objects.filter(
+            descendant__product__in=queryset.order_by().values("id")
+        )
+        .values("ancestor_id")
+        .annotate(count=Count("descendant__product"))
+        .order_by("ancestor_id")
+    )
+
+    return {
+        "total": counts["total"],
+        "price": {
+            "min": prices["minPrice"],
+            "max": prices["maxPrice"],
+            "buckets": buckets,
+        },
+        "freeDelivery": counts["freeDelivery"],
+        "available": counts["available"],
+        "tags": [
+            {"id": row["tag_id"], "name": row["tag__name"], "count": row["count"]}
+            for row in tags
+        ],
+        "categories": [
+            {"id": row["ancestor_id"], "count": row["count"]} for row in categories
+        ],
+    }
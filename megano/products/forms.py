@@ -5,10 +5,7 @@ from .models import Sale, Product
 
 
 class AddProductsToSaleForm(forms.Form):
-    sale_choices = [(sale.id, sale.name) for sale in Sale.objects.all()]
-    product_choices = [(product.title, product.id) for product in Product.objects.all().order_by("category")]
-
-    sales = forms.ChoiceField(choices=sale_choices)
+    sales = forms.ModelChoiceField(queryset=Sale.objects.all(), empty_label=None)
     products = forms.ModelMultipleChoiceField(queryset=Product.objects.all().order_by("category"))
 
 
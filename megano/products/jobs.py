@@ -0,0 +1,50 @@
+import logging
+import threading
+from typing import Callable, Dict, Optional
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+JOB_KEY = "job:{}"
+JOB_TIMEOUT = 60 * 60 * 24
+
+
+def job_status(job_id: str) -> Optional[Dict]:
+    return cache.get(JOB_KEY.format(job_id))
+
+
+def _set_status(job_id: str, **status) -> None:
+    key = JOB_KEY.format(job_id)
+    cache.set(key, {**(cache.get(key) or {}), **status}, JOB_TIMEOUT)
+
+
+def start_job(name: str, total: int, task: Callable, *args, **kwargs) -> str:
+    """Run ``task`` in a background thread and return the id of its job.
+
+    The task gets a ``progress`` callback taking the number of processed items.
+    Its state (``pending``, ``running``, ``done`` or ``failed``) and progress are
+    kept in the cache, see ``job_status``. Inside a transaction the thread starts
+    once it commits, so the task sees the data written before it.
+    """
+    job_id = uuid4().hex
+    _set_status(job_id, name=name, status="pending", done=0, total=total)
+
+    def progress(done: int) -> None:
+        _set_status(job_id, status="running", done=done)
+
+    def run() -> None:
+        try:
+            task(*args, progress=progress, **kwargs)
+            _set_status(job_id, status="done", done=total)
+        except Exception as error:
+            logger.exception("Job %s (%s) failed", job_id, name)
+            _set_status(job_id, status="failed", error=str(error))
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=run, name=f"job-{job_id}")
+    transaction.on_commit(thread.start)
+    return job_id
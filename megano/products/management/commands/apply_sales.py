@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from products.sales import apply_sale_schedule
+
+
+class Command(BaseCommand):
+    help = (
+        "Activate the sales whose window has started, expire the finished ones and "
+        "reprice their products, e.g. every few minutes from cron"
+    )
+
+    def handle(self, *args, **options) -> None:
+        started, ended = apply_sale_schedule()
+        self.stdout.write(f"Activated {started} sales, expired {ended} sales")
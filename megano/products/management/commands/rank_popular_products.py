@@ -0,0 +1,100 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from orders.models import Order, OrderItem
+from products.models import Product, ProductPopularity, Review
+from products.popularity import HALF_LIFE, SETTLE_TIME, rank_products
+
+
+class Command(BaseCommand):
+    help = (
+        "Fold recent sales and reviews into the time-decayed popularity ranking, "
+        "e.g. hourly from cron"
+    )
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            "--half-life-days", type=float, default=HALF_LIFE / timedelta(days=1)
+        )
+        parser.add_argument(
+            "--benchmark",
+            type=int,
+            metavar="PRODUCTS",
+            help="Time a full and an incremental run over this many generated "
+            "products inside a rolled back transaction",
+        )
+
+    def handle(self, *args, **options) -> None:
+        half_life = timedelta(days=options["half_life_days"])
+        if options["benchmark"]:
+            self.benchmark(options["benchmark"], half_life)
+            return
+        changed = rank_products(half_life=half_life)
+        self.stdout.write(f"Ranked products, {changed} with new sales or reviews")
+
+    def benchmark(self, size: int, half_life: timedelta) -> None:
+        now = timezone.now()
+        with transaction.atomic():
+            products = Product.objects.bulk_create(
+                (
+                    Product(title=f"benchmark {i}", price=1, count=1)
+                    for i in range(size)
+                ),
+                batch_size=1000,
+            )
+            product_ids = [product.id for product in products]
+            orders = Order.objects.bulk_create(
+                Order(paid=True, paid_at=now - timedelta(days=days))
+                for days in range(60)
+            )
+            OrderItem.objects.bulk_create(
+                (
+                    OrderItem(
+                        order=random.choice(orders),
+                        product_id=random.choice(product_ids),
+                        count=random.randint(1, 3),
+                    )
+                    for _ in range(size // 2)
+                ),
+                batch_size=1000,
+            )
+            Review.objects.bulk_create(
+                (
+                    Review(
+                        product_id=random.choice(product_ids),
+                        email="benchmark@example.com",
+                        rate=random.randint(1, 5),
+                        text="benchmark",
+                        is_checked=True,
+                        checked_at=now - timedelta(days=random.uniform(0, 60)),
+                    )
+                    for _ in range(size // 2)
+                ),
+                batch_size=1000,
+            )
+            ProductPopularity.objects.all().delete()
+
+            started = time.perf_counter()
+            rank_products(now=now, half_life=half_life)
+            self.stdout.write(
+                f"Full run over {size} products: {time.perf_counter() - started:.2f}s"
+            )
+
+            later = now + timedelta(hours=1)
+            order = Order.objects.create(paid=True, paid_at=later - SETTLE_TIME)
+            OrderItem.objects.bulk_create(
+                OrderItem(order=order, product_id=random.choice(product_ids))
+                for _ in range(max(size // 100, 1))
+            )
+            started = time.perf_counter()
+            changed = rank_products(now=later, half_life=half_life)
+            self.stdout.write(
+                f"Incremental run with {changed} changed products: "
+                f"{time.perf_counter() - started:.2f}s"
+            )
+            transaction.set_rollback(True)
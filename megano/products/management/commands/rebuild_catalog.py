@@ -0,0 +1,19 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from products.facets import refresh_product_tags
+from products.models import Product
+from products.tree import rebuild_category_closure
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the category closure, tag facets, search index and product cards, "
+        "e.g. after loaddata"
+    )
+
+    def handle(self, *args, **options) -> None:
+        rebuild_category_closure()
+        refresh_product_tags(Product.objects.values_list("id", flat=True))
+        call_command("rebuild_search_index", stdout=self.stdout)
+        call_command("rebuild_product_cards", stdout=self.stdout)
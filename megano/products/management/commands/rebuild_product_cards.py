@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from products.cards import refresh_product_cards
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = "Rebuild the precomputed product cards used by the listing endpoints"
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options) -> None:
+        batch_size = options["batch_size"]
+        product_ids = list(Product.objects.order_by("id").values_list("id", flat=True))
+        for start in range(0, len(product_ids), batch_size):
+            refresh_product_cards(product_ids[start:start + batch_size])
+        self.stdout.write(f"Rebuilt {len(product_ids)} product cards")
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from products.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product search index used by the catalog name filter"
+
+    def handle(self, *args, **options) -> None:
+        backend = get_search_backend()
+        backend.rebuild()
+        self.stdout.write(f"Rebuilt search index with {type(backend).__name__}")
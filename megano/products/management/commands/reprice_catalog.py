@@ -0,0 +1,63 @@
+import argparse
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.repricing import (
+    Markup,
+    basis_points,
+    numpy,
+    plan_repricing,
+    write_prices,
+)
+
+
+def markup(value: str) -> Markup:
+    percent, _, category = value.partition(":")
+    try:
+        basis_points(percent)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(str(error))
+    if category and not category.isdigit():
+        raise argparse.ArgumentTypeError(f"{category!r} is not a category id")
+    return Markup(percent, int(category) if category else None)
+
+
+class Command(BaseCommand):
+    help = (
+        "Change base prices by percentages, catalog-wide or per category, and "
+        "recalculate sale prices"
+    )
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            "--markup",
+            type=markup,
+            action="append",
+            default=[],
+            metavar="PERCENT[:CATEGORY]",
+            help="Applied in order, e.g. --markup 5 --markup=-10:3",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Print the changes without saving"
+        )
+
+    def handle(self, *args, **options) -> None:
+        started = time.perf_counter()
+        try:
+            changes = plan_repricing(options["markup"])
+        except ValueError as error:
+            raise CommandError(error)
+        self.stdout.write(
+            f"Planned {len(changes)} price changes in "
+            f"{time.perf_counter() - started:.2f}s "
+            f"({'NumPy' if numpy else 'pure Python'} columns)"
+        )
+        if options["dry_run"]:
+            for pk, base, new_base, price, new_price in changes:
+                self.stdout.write(
+                    f"{pk}: base price {base} -> {new_base}, price {price} -> {new_price}"
+                )
+            return
+        write_prices(changes)
+        self.stdout.write(f"Saved {len(changes)} products")
@@ -0,0 +1,58 @@
+from django.db import migrations
+
+CREATE_SEARCH_TABLE = """
+CREATE VIRTUAL TABLE products_search USING fts5(
+    title, description, specifications, tags, tokenize="unicode61"
+)
+"""
+
+POPULATE_SEARCH_TABLE = """
+INSERT INTO products_search (rowid, title, description, specifications, tags)
+SELECT
+    p.id,
+    p.title,
+    COALESCE(p.description, ''),
+    COALESCE((
+        SELECT group_concat(s.name || ' ' || COALESCE(s.value, ''), ' ')
+        FROM products_specification s
+        WHERE s.product_id = p.id
+    ), ''),
+    COALESCE((
+        SELECT group_concat(t.name, ' ')
+        FROM products_tag t
+        JOIN products_category_tags ct ON ct.tag_id = t.id
+        JOIN products_category c ON c.id = p.category_id
+        WHERE ct.category_id = c.id OR ct.category_id = c.parent_id
+    ), '')
+FROM products_product p
+"""
+
+
+def has_fts5(connection) -> bool:
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        return "ENABLE_FTS5" in {row[0] for row in cursor.fetchall()}
+
+
+def create_search_table(apps, schema_editor) -> None:
+    connection = schema_editor.connection
+    if connection.vendor != "sqlite" or not has_fts5(connection):
+        return
+    schema_editor.execute(CREATE_SEARCH_TABLE)
+    schema_editor.execute(POPULATE_SEARCH_TABLE)
+
+
+def drop_search_table(apps, schema_editor) -> None:
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS products_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0002_productcard"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
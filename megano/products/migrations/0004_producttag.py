@@ -0,0 +1,42 @@
+# Generated by Django 4.2.4 on 2026-10-18 12:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+POPULATE_PRODUCT_TAGS = """
+INSERT INTO products_producttag (product_id, tag_id)
+SELECT DISTINCT p.id, ct.tag_id
+FROM products_product p
+JOIN products_category c ON c.id = p.category_id
+JOIN products_category_tags ct
+    ON ct.category_id = c.id OR ct.category_id = c.parent_id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_product_search'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='price',
+            field=models.DecimalField(db_index=True, decimal_places=2, max_digits=10),
+        ),
+        migrations.CreateModel(
+            name='ProductTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='facet_tags', to='products.product')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='facet_products', to='products.tag')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='producttag',
+            constraint=models.UniqueConstraint(fields=('tag', 'product'), name='unique_product_tag'),
+        ),
+        migrations.RunSQL(POPULATE_PRODUCT_TAGS, migrations.RunSQL.noop),
+    ]
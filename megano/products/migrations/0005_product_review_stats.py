@@ -0,0 +1,45 @@
+# Generated by Django 4.2.4 on 2026-10-18 12:49
+
+from django.db import migrations, models
+
+
+def fill_review_stats(apps, schema_editor) -> None:
+    Product = apps.get_model("products", "Product")
+    Review = apps.get_model("products", "Review")
+    stats = (
+        Review.objects.filter(is_checked=True)
+        .values("product_id")
+        .annotate(count=models.Count("id"), rate=models.Sum("rate"))
+    )
+    for row in stats:
+        Product.objects.filter(id=row["product_id"]).update(
+            reviews_count=row["count"],
+            rating_sum=row["rate"],
+            rating=round(row["rate"] / row["count"], 1),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_producttag'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='reviews_count',
+            field=models.IntegerField(db_index=True, default=0),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='rating',
+            field=models.DecimalField(db_index=True, decimal_places=1, default=5, max_digits=3),
+        ),
+        migrations.RunPython(fill_review_stats, migrations.RunPython.noop),
+    ]
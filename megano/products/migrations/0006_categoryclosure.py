@@ -0,0 +1,46 @@
+# Generated by Django 4.2.4 on 2026-10-18 12:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_category_closure(apps, schema_editor) -> None:
+    Category = apps.get_model("products", "Category")
+    CategoryClosure = apps.get_model("products", "CategoryClosure")
+    parents = dict(Category.objects.values_list("id", "parent_id"))
+    rows = []
+    for category_id in parents:
+        ancestor_id, depth, seen = category_id, 0, set()
+        while ancestor_id is not None and ancestor_id not in seen:
+            seen.add(ancestor_id)
+            rows.append(
+                CategoryClosure(
+                    ancestor_id=ancestor_id, descendant_id=category_id, depth=depth
+                )
+            )
+            ancestor_id, depth = parents.get(ancestor_id), depth + 1
+    CategoryClosure.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_product_review_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='products.category')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='products.category')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='categoryclosure',
+            constraint=models.UniqueConstraint(fields=('ancestor', 'descendant'), name='unique_category_closure'),
+        ),
+        migrations.RunPython(fill_category_closure, migrations.RunPython.noop),
+    ]
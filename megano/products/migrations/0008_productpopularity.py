@@ -0,0 +1,25 @@
+# Generated by Django 4.2.4 on 2026-10-18 12:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductPopularity',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='popularity', serialize=False, to='products.product')),
+                ('sales', models.FloatField(default=0)),
+                ('reviews', models.FloatField(default=0)),
+                ('score', models.FloatField(db_index=True, default=0)),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
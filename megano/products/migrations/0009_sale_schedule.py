@@ -0,0 +1,53 @@
+# Generated by Django 4.2.4 on 2026-10-18 12:58
+
+import decimal
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fill_base_prices(apps, schema_editor) -> None:
+    """Split the stored prices into base prices and sale state.
+
+    Prices of products on a sale were stored discounted, so their base price is
+    recovered the way the sales endpoint did it. Products whose sale is over
+    go back to the base price.
+    """
+    Product = apps.get_model("products", "Product")
+    Sale = apps.get_model("products", "Sale")
+    moment = timezone.now()
+    for sale in Sale.objects.all():
+        sale.active = sale.dateFrom <= moment < sale.dateTo
+        sale.save(update_fields=["active"])
+    products = list(Product.objects.select_related("sale"))
+    for product in products:
+        product.base_price = product.price
+        if product.sale:
+            product.base_price = Decimal(
+                product.price / (1 - product.sale.salePrice / 100)
+            ).quantize(Decimal("0.01"), decimal.ROUND_HALF_UP)
+            if not product.sale.active:
+                product.price = product.base_price
+    Product.objects.bulk_update(products, ["base_price", "price"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_productpopularity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='base_price',
+            field=models.DecimalField(blank=True, decimal_places=2, help_text='Price without a sale, the price itself is derived from it', max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='active',
+            field=models.BooleanField(db_index=True, default=False, editable=False),
+        ),
+        migrations.RunPython(fill_base_prices, migrations.RunPython.noop),
+    ]
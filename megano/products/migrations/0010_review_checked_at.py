@@ -0,0 +1,25 @@
+# Generated by Django 4.2.4 on 2026-10-18 13:34
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_checked_at(apps, schema_editor) -> None:
+    Review = apps.get_model("products", "Review")
+    Review.objects.filter(is_checked=True).update(checked_at=F("date"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_sale_schedule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='review',
+            name='checked_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(fill_checked_at, migrations.RunPython.noop),
+    ]
@@ -2,6 +2,8 @@ import datetime
 import decimal
 from _decimal import Decimal
 
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.utils.timezone import now, timedelta
 
@@ -38,10 +40,14 @@ class Sale(models.Model):
     )
     dateFrom = models.DateTimeField(default=now)
     dateTo = models.DateTimeField(default=get_date_to)
+    active = models.BooleanField(default=False, db_index=True, editable=False)
 
     def __str__(self) -> str:
         return f"{self.name}"
 
+    def is_live(self, moment: datetime.datetime) -> bool:
+        return self.dateFrom <= moment < self.dateTo
+
 
 class Category(models.Model):
     title = models.CharField(max_length=40, null=False, blank=False)
@@ -56,36 +62,84 @@ class Category(models.Model):
         blank=True,
     )
     tags = models.ManyToManyField(Tag, related_name="category")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def clean(self) -> None:
+        if (
+            self.pk
+            and self.parent_id
+            and CategoryClosure.objects.filter(
+                ancestor_id=self.pk, descendant_id=self.parent_id
+            ).exists()
+        ):
+            raise ValidationError(
+                {"parent": "A category cannot be nested inside its own subtree."}
+            )
 
     def __str__(self) -> str:
         return self.title
 
 
+class CategoryClosure(models.Model):
+    """Every ancestor/descendant pair of the category tree, itself included."""
+
+    ancestor = models.ForeignKey(
+        Category, on_delete=models.CASCADE, related_name="descendant_links"
+    )
+    descendant = models.ForeignKey(
+        Category, on_delete=models.CASCADE, related_name="ancestor_links"
+    )
+    depth = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["ancestor", "descendant"], name="unique_category_closure"
+            )
+        ]
+
+
 class Product(models.Model):
     category = models.ForeignKey(
         Category, on_delete=models.DO_NOTHING, related_name="product", null=True
     )
-    price = models.DecimalField(decimal_places=2, max_digits=10)
+    price = models.DecimalField(decimal_places=2, max_digits=10, db_index=True)
+    base_price = models.DecimalField(
+        decimal_places=2, max_digits=10, null=True, blank=True,
+        help_text="Price without a sale, the price itself is derived from it",
+    )
     count = models.IntegerField(default=0)
     date = models.DateTimeField(default=now)
     title = models.CharField(max_length=50, unique=True)
     description = models.TextField(max_length=500, blank=True, null=True)
     freeDelivery = models.BooleanField(default=False)
-    rating = models.DecimalField(decimal_places=1, max_digits=3, default=5)
+    rating = models.DecimalField(
+        decimal_places=1, max_digits=3, default=5, db_index=True
+    )
+    reviews_count = models.IntegerField(default=0, db_index=True)
+    rating_sum = models.IntegerField(default=0)
     limited = models.BooleanField(default=False)
     sale = models.ForeignKey(
         Sale, on_delete=models.SET_NULL, related_name="product", null=True, blank=True
     )
+    updated_at = models.DateTimeField(auto_now=True)
 
     def return_origin_price(self) -> None:
-        if self.sale:
-            self.price = Decimal(self.price / (1 - self.sale.salePrice/100)).quantize(
-                                    Decimal("0.01"), decimal.ROUND_HALF_UP)
+        self.price = self.base_price
 
     def make_sale_price(self) -> None:
-        self.price = Decimal(self.price * (100 - self.sale.salePrice) / 100).quantize(
+        self.price = Decimal(self.base_price * (100 - self.sale.salePrice) / 100).quantize(
             Decimal("0.01"), decimal.ROUND_HALF_UP)
 
+    def update_price(self) -> None:
+        """Derive the price from the base price and the sale, if it is active."""
+        if self.base_price is None:
+            self.base_price = self.price
+        if self.sale and self.sale.active:
+            self.make_sale_price()
+        else:
+            self.return_origin_price()
+
     def __str__(self) -> str:
         # return self.title + " " + self.category
         return f"{self.title} ({self.category})"
@@ -105,6 +159,8 @@ class Review(models.Model):
     email = models.EmailField(max_length=30, null=False, blank=False)
     rate = models.IntegerField()
     date = models.DateTimeField(default=now)
+    # When the review was approved, see ``products.popularity``
+    checked_at = models.DateTimeField(null=True, blank=True, db_index=True)
     text = models.TextField(max_length=400, null=False, blank=False)
     product = models.ForeignKey(
         Product, on_delete=models.CASCADE, related_name="review"
@@ -129,3 +185,38 @@ class ProductImage(models.Model):
 
     def __str__(self) -> str:
         return self.alt
+
+
+class ProductCard(models.Model):
+    """Precomputed ProductSerializer payload used by the listing endpoints."""
+
+    product = models.OneToOneField(
+        Product, on_delete=models.CASCADE, primary_key=True, related_name="card"
+    )
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+
+
+class ProductTag(models.Model):
+    """Tags a product inherits from its category and every category above it."""
+
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="facet_tags"
+    )
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name="facet_products")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["tag", "product"], name="unique_product_tag")
+        ]
+
+
+class ProductPopularity(models.Model):
+    """Time-decayed popularity of a product, recomputed by rank_popular_products."""
+
+    product = models.OneToOneField(
+        Product, on_delete=models.CASCADE, primary_key=True, related_name="popularity"
+    )
+    sales = models.FloatField(default=0)
+    reviews = models.FloatField(default=0)
+    score = models.FloatField(default=0, db_index=True)
+    computed_at = models.DateTimeField(default=now)
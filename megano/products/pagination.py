@@ -0,0 +1,105 @@
+import base64
+import hashlib
+import json
+import math
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Field, Model, Q, QuerySet
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.request import Request
+
+
+class KeysetPagination(PageNumberPagination):
+    """Page number pagination with an opt-in keyset (cursor) mode.
+
+    A request carrying the ``cursor`` query parameter (empty for the first page)
+    is paginated by seeking past the last seen ``(sort value, id)`` pair instead
+    of an OFFSET, and its ``lastPage`` comes from a cached count.
+    """
+
+    cursor_query_param = "cursor"
+    last_page_cache_timeout = 60
+    next_cursor = None
+
+    def is_keyset_request(self, request: Request) -> bool:
+        return self.cursor_query_param in request.query_params
+
+    def encode_cursor(self, value, pk: int) -> str:
+        if isinstance(value, datetime):
+            # The JSON encoder drops microseconds, which would skip rows
+            value = value.isoformat()
+        raw = json.dumps([value, pk], cls=DjangoJSONEncoder)
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def sort_field_of(self, queryset: QuerySet, sort_field: str) -> Field:
+        # Annotations such as ``search_rank`` are not model fields
+        annotation = queryset.query.annotations.get(sort_field)
+        if annotation is not None:
+            return annotation.output_field
+        return queryset.model._meta.get_field(sort_field)
+
+    def decode_cursor(
+        self, cursor: Optional[str], field: Optional[Field] = None
+    ) -> Optional[Tuple]:
+        """Return the sort value, as ``field`` reads it, and the id of the cursor."""
+        if not cursor:
+            return None
+        try:
+            value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if field is not None:
+                value = field.to_python(value)
+            if value is None:
+                raise ValueError("The cursor has no sort value")
+            return value, int(pk)
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound("Invalid cursor.")
+
+    def paginate_keyset(
+        self,
+        queryset: QuerySet,
+        request: Request,
+        sort_field: str = "id",
+        descending: bool = False,
+    ) -> List[Model]:
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(
+            request.query_params.get(self.cursor_query_param),
+            self.sort_field_of(queryset, sort_field),
+        )
+        lookup = "lt" if descending else "gt"
+        if cursor:
+            value, pk = cursor
+            queryset = queryset.filter(
+                Q(**{f"{sort_field}__{lookup}": value})
+                | Q(**{sort_field: value, f"id__{lookup}": pk})
+            )
+        prefix = "-" if descending else ""
+        page = list(
+            queryset.order_by(prefix + sort_field, prefix + "id")[: page_size + 1]
+        )
+        self.next_cursor = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            last = page[-1]
+            self.next_cursor = self.encode_cursor(getattr(last, sort_field), last.id)
+        return page
+
+    def get_cached_last_page(self, queryset: QuerySet, request: Request) -> int:
+        params = sorted(
+            (key, value)
+            for key, values in request.query_params.lists()
+            if key not in (self.cursor_query_param, self.page_query_param)
+            for value in values
+        )
+        digest = hashlib.md5(json.dumps(params).encode()).hexdigest()
+        cache_key = f"last-page:{request.path}:{digest}"
+        count = cache.get(cache_key)
+        if count is None:
+            count = queryset.count()
+            cache.set(cache_key, count, self.last_page_cache_timeout)
+        return max(1, math.ceil(count / self.get_page_size(request)))
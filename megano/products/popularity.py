@@ -0,0 +1,121 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import F, FloatField, OuterRef, Subquery
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from orders.models import OrderItem
+
+from .cache import bump_versions
+from .models import Product, ProductPopularity, Review
+
+HALF_LIFE = timedelta(days=14)
+SALES_WEIGHT = 1.0
+REVIEWS_WEIGHT = 2.0
+RATING_WEIGHT = 0.5
+# Reviews needed before the average rating counts in full
+RATING_PRIOR = 5
+BATCH_SIZE = 1000
+# Longer than any transaction stamping a sale or a review approval
+SETTLE_TIME = timedelta(minutes=5)
+
+
+def decayed_counts(
+    events: Iterable[Tuple[int, int, datetime]], now: datetime, half_life: timedelta
+) -> Dict[int, float]:
+    """Sum (product id, amount, time) events, halving their weight every half-life."""
+    counts = defaultdict(float)
+    for product_id, amount, happened_at in events:
+        age = max((now - happened_at) / half_life, 0)
+        counts[product_id] += amount * 0.5**age
+    return counts
+
+
+def rank_products(
+    now: Optional[datetime] = None, half_life: timedelta = HALF_LIFE
+) -> int:
+    """Fold the sales and checked reviews since the last run into the ranking.
+
+    Stored counters are decayed with a single UPDATE, so a run only reads the
+    events that happened since the previous one. Order lines count as sales
+    when the order is paid and reviews when they are approved. Runs stop
+    ``SETTLE_TIME`` before ``now``, so events stamped inside transactions that
+    commit after the run started are still read by the next one. Returns the
+    number of products with new events.
+    """
+    now = (now or timezone.now()) - SETTLE_TIME
+    last_run = (
+        ProductPopularity.objects.order_by("-computed_at")
+        .values_list("computed_at", flat=True)
+        .first()
+    )
+    sales = OrderItem.objects.filter(order__paid=True, order__paid_at__lte=now)
+    reviews = Review.objects.filter(is_checked=True, checked_at__lte=now)
+    if last_run:
+        sales = sales.filter(order__paid_at__gt=last_run)
+        reviews = reviews.filter(checked_at__gt=last_run)
+    new_sales = decayed_counts(
+        sales.values_list("product_id", "count", "order__paid_at").iterator(),
+        now,
+        half_life,
+    )
+    new_reviews = decayed_counts(
+        (
+            (product_id, 1, checked_at)
+            for product_id, checked_at in reviews.values_list(
+                "product_id", "checked_at"
+            ).iterator()
+        ),
+        now,
+        half_life,
+    )
+
+    with transaction.atomic():
+        if last_run:
+            decay = 0.5 ** ((now - last_run) / half_life)
+            ProductPopularity.objects.update(
+                sales=F("sales") * decay, reviews=F("reviews") * decay
+            )
+        changed = new_sales.keys() | new_reviews.keys()
+        ProductPopularity.objects.bulk_create(
+            (
+                ProductPopularity(
+                    product_id=pk,
+                    sales=new_sales.pop(pk, 0),
+                    reviews=new_reviews.pop(pk, 0),
+                )
+                for pk in Product.objects.filter(popularity__isnull=True)
+                .values_list("id", flat=True)
+                .iterator()
+            ),
+            batch_size=BATCH_SIZE,
+        )
+
+        existing = sorted(new_sales.keys() | new_reviews.keys())
+        for start in range(0, len(existing), BATCH_SIZE):
+            rows = list(
+                ProductPopularity.objects.filter(
+                    product_id__in=existing[start:start + BATCH_SIZE]
+                )
+            )
+            for row in rows:
+                row.sales += new_sales.get(row.product_id, 0)
+                row.reviews += new_reviews.get(row.product_id, 0)
+            ProductPopularity.objects.bulk_update(rows, ["sales", "reviews"])
+
+        rating = Product.objects.filter(id=OuterRef("product_id")).annotate(
+            weighted_rating=Cast("rating", FloatField())
+            * F("reviews_count")
+            / (F("reviews_count") + RATING_PRIOR)
+        )
+        ProductPopularity.objects.update(
+            score=SALES_WEIGHT * F("sales")
+            + REVIEWS_WEIGHT * F("reviews")
+            + RATING_WEIGHT * Subquery(rating.values("weighted_rating")),
+            computed_at=now,
+        )
+        bump_versions("popularity")
+    return len(changed)
@@ -0,0 +1,195 @@
+from decimal import Decimal, InvalidOperation
+from typing import Iterable, List, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, QuerySet, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .cache import bump_versions
+from .cards import refresh_product_cards
+from .models import CategoryClosure, Product
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+BATCH_SIZE = 500
+# Factor of an unchanged price, in basis points
+UNIT = 10000
+
+Change = Tuple[int, Decimal, Decimal, Decimal, Decimal]
+
+
+def basis_points(percent) -> int:
+    try:
+        value = Decimal(str(percent)) * 100
+    except InvalidOperation:
+        raise ValueError(f"{percent!r} is not a percentage")
+    if not value.is_finite():
+        raise ValueError(f"{percent!r} is not a percentage")
+    if value != value.to_integral_value():
+        raise ValueError(f"{percent}% has more than two decimal places")
+    return int(value)
+
+
+def _column(values: Iterable[int]):
+    values = list(values)
+    return numpy.array(values, dtype=numpy.int64) if numpy else values
+
+
+def _multiply(cents, factors):
+    """Multiply cents by factors in basis points, rounding half up."""
+    if numpy:
+        return (2 * cents * factors + UNIT) // (2 * UNIT)
+    return [
+        (2 * value * factor + UNIT) // (2 * UNIT)
+        for value, factor in zip(cents, factors)
+    ]
+
+
+def _where(mask, value: int, default: int):
+    if numpy:
+        return numpy.where(mask, value, default)
+    return [value if selected else default for selected in mask]
+
+
+def _changed(*pairs) -> List[int]:
+    if numpy:
+        mask = numpy.zeros(len(pairs[0][0]), dtype=bool)
+        for old, new in pairs:
+            mask |= old != new
+        return numpy.flatnonzero(mask).tolist()
+    return [
+        index
+        for index in range(len(pairs[0][0]))
+        if any(old[index] != new[index] for old, new in pairs)
+    ]
+
+
+class PriceTable:
+    """Base prices, prices and active sale discounts of products as columns.
+
+    The columns are NumPy arrays when NumPy is installed and lists otherwise.
+    They hold integer cents and basis points and are rounded half up, so the
+    results match ``Decimal.quantize(ROUND_HALF_UP)`` exactly.
+    """
+
+    def __init__(self, rows: List[Tuple]):
+        self.ids = [row[0] for row in rows]
+        self.categories = _column(row[1] or 0 for row in rows)
+        self.base = _column(int(row[2] * 100) for row in rows)
+        self.prices = _column(int(row[3] * 100) for row in rows)
+        self.discounts = _column(int(row[4] * 100) for row in rows)
+        self.new_base = self.base
+
+    @classmethod
+    def load(cls, queryset: Optional[QuerySet[Product]] = None) -> "PriceTable":
+        queryset = Product.objects.all() if queryset is None else queryset
+        discount = Case(
+            When(sale__active=True, then=F("sale__salePrice")),
+            default=Value(Decimal(0)),
+            output_field=DecimalField(decimal_places=2, max_digits=10),
+        )
+        return cls(
+            list(
+                queryset.order_by("id").values_list(
+                    "id",
+                    "category_id",
+                    Coalesce("base_price", "price"),
+                    "price",
+                    discount,
+                )
+            )
+        )
+
+    def in_categories(self, category_ids: Iterable[int]):
+        category_ids = set(category_ids)
+        if numpy:
+            return numpy.isin(self.categories, list(category_ids))
+        return [category in category_ids for category in self.categories]
+
+    def change_base(self, percent, mask=None) -> None:
+        """Raise (or lower, for a negative ``percent``) the selected base prices."""
+        factor = UNIT + basis_points(percent)
+        if factor < 0:
+            raise ValueError(f"Cannot lower prices by {percent}%")
+        mask = [True] * len(self.ids) if mask is None else mask
+        self.new_base = _multiply(self.new_base, _where(mask, factor, UNIT))
+
+    def new_prices(self):
+        """Prices derived from the new base prices and the active sales."""
+        if numpy:
+            return _multiply(self.new_base, UNIT - self.discounts)
+        return _multiply(
+            self.new_base, [UNIT - discount for discount in self.discounts]
+        )
+
+    def changes(self) -> List[Change]:
+        """Return (id, base price, new base price, price, new price) of changed rows."""
+        new_prices = self.new_prices()
+        cent = Decimal("0.01")
+        return [
+            (
+                self.ids[index],
+                int(self.base[index]) * cent,
+                int(self.new_base[index]) * cent,
+                int(self.prices[index]) * cent,
+                int(new_prices[index]) * cent,
+            )
+            for index in _changed(
+                (self.base, self.new_base), (self.prices, new_prices)
+            )
+        ]
+
+
+class Markup:
+    """Change base prices by ``percent``, in a category subtree if one is given."""
+
+    def __init__(self, percent, category_id: Optional[int] = None):
+        self.percent = percent
+        self.category_id = category_id
+
+    def apply(self, table: PriceTable) -> None:
+        mask = None
+        if self.category_id is not None:
+            mask = table.in_categories(
+                CategoryClosure.objects.filter(
+                    ancestor_id=self.category_id
+                ).values_list("descendant_id", flat=True)
+            )
+        table.change_base(self.percent, mask)
+
+
+def plan_repricing(
+    rules: Iterable[Markup], queryset: Optional[QuerySet[Product]] = None
+) -> List[Change]:
+    """Apply the rules in order and return the resulting price changes.
+
+    Prices of products on an active sale are recalculated from their new base
+    price, which also repairs prices that drifted from their base price.
+    """
+    table = PriceTable.load(queryset)
+    for rule in rules:
+        rule.apply(table)
+    return table.changes()
+
+
+def write_prices(changes: List[Change]) -> int:
+    """Store the planned prices with chunked bulk updates in one transaction."""
+    now = timezone.now()
+    with transaction.atomic():
+        for start in range(0, len(changes), BATCH_SIZE):
+            batch = changes[start:start + BATCH_SIZE]
+            Product.objects.bulk_update(
+                [
+                    Product(id=pk, base_price=base, price=price, updated_at=now)
+                    for pk, _, base, _, price in batch
+                ],
+                ["base_price", "price", "updated_at"],
+            )
+            refresh_product_cards([change[0] for change in batch])
+        if changes:
+            bump_versions("products")
+    return len(changes)
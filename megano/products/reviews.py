@@ -0,0 +1,28 @@
+from django.db.models import Case, DecimalField, F, FloatField, Value, When
+from django.db.models.functions import Cast, Now, Round
+
+from .models import Product
+
+
+def update_review_stats(product_id: int, rate: int, count: int) -> None:
+    """Add ``count`` checked reviews rating ``rate`` in total to the product.
+
+    Negative values remove reviews. The counters and the average are rewritten
+    in one UPDATE from the stored values, so concurrent moderation cannot lose
+    an increment.
+    """
+    reviews_count = F("reviews_count") + count
+    rating_sum = F("rating_sum") + rate
+    Product.objects.filter(id=product_id).update(
+        reviews_count=reviews_count,
+        rating_sum=rating_sum,
+        rating=Case(
+            When(
+                reviews_count__lte=-count,
+                then=Value(Product._meta.get_field("rating").default),
+            ),
+            default=Round(Cast(rating_sum, FloatField()) / reviews_count, 1),
+            output_field=DecimalField(decimal_places=1, max_digits=3),
+        ),
+        updated_at=Now(),
+    )
@@ -0,0 +1,127 @@
+from datetime import datetime
+from typing import Callable, Iterable, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import (
+    F,
+    FloatField,
+    IntegerField,
+    OuterRef,
+    Q,
+    Subquery,
+    Value,
+)
+from django.db.models.functions import Cast, Coalesce, Now, Round
+from django.utils import timezone
+
+from .cache import bump_versions
+from .cards import refresh_product_cards
+from .models import Product, Sale
+
+BATCH_SIZE = 500
+# Selections larger than this are assigned by a background job
+BACKGROUND_THRESHOLD = 1000
+
+Progress = Callable[[int], None]
+
+
+def cents(expression) -> Cast:
+    return Cast(Round(expression * 100), IntegerField())
+
+
+def effective_price(percent=None):
+    """SQL expression of the price: the base price less the active sale, if any.
+
+    ``percent`` overrides the discount looked up from the product's sale. The
+    discount is computed in integer cents and basis points and rounded half up,
+    the same as ``Product.make_sale_price``.
+    """
+    if percent is None:
+        percent = Coalesce(
+            Subquery(
+                Sale.objects.filter(id=OuterRef("sale_id"), active=True).values(
+                    "salePrice"
+                )[:1]
+            ),
+            Value(0),
+        )
+    else:
+        percent = Value(percent)
+    # Products saved before base prices existed may still have none
+    base_price = Coalesce(F("base_price"), F("price"))
+    price_cents = (cents(base_price) * (10000 - cents(percent)) + 5000) / 10000
+    return Cast(price_cents, FloatField()) / 100
+
+
+def _update_in_batches(
+    product_ids: Iterable[int], progress: Optional[Progress], **fields
+) -> int:
+    product_ids = list(product_ids)
+    updated = 0
+    with transaction.atomic():
+        for start in range(0, len(product_ids), BATCH_SIZE):
+            batch = product_ids[start:start + BATCH_SIZE]
+            updated += Product.objects.filter(id__in=batch).update(
+                updated_at=Now(), **fields
+            )
+            refresh_product_cards(batch)
+            if progress:
+                progress(start + len(batch))
+        if updated:
+            bump_versions("products")
+    return updated
+
+
+def reprice_products(
+    product_ids: Iterable[int], progress: Optional[Progress] = None
+) -> int:
+    """Rewrite the prices of the products from their base price and sale.
+
+    Each batch of products is repriced by one UPDATE and gets its cards rebuilt,
+    all in one transaction.
+    """
+    return _update_in_batches(product_ids, progress, price=effective_price())
+
+
+def assign_sale(
+    product_ids: Iterable[int],
+    sale: Optional[Sale],
+    progress: Optional[Progress] = None,
+) -> int:
+    """Put the products on ``sale``, or take them off their sale if it is None.
+
+    The sale and the price are written by the same UPDATE.
+    """
+    percent = sale.salePrice if sale and sale.active else 0
+    return _update_in_batches(
+        product_ids, progress, sale=sale, price=effective_price(percent)
+    )
+
+
+def live(moment: datetime) -> Q:
+    return Q(dateFrom__lte=moment, dateTo__gt=moment)
+
+
+def apply_sale_schedule(now: Optional[datetime] = None) -> Tuple[int, int]:
+    """Activate the sales whose window has started and expire the finished ones.
+
+    Only the products of sales that changed state are repriced. Returns the
+    number of activated and deactivated sales.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        Product.objects.filter(base_price__isnull=True).update(base_price=F("price"))
+        starting = list(
+            Sale.objects.filter(live(now), active=False).values_list("id", flat=True)
+        )
+        ending = list(
+            Sale.objects.filter(~live(now), active=True).values_list("id", flat=True)
+        )
+        Sale.objects.filter(id__in=starting).update(active=True)
+        Sale.objects.filter(id__in=ending).update(active=False)
+        reprice_products(
+            Product.objects.filter(sale_id__in=starting + ending).values_list(
+                "id", flat=True
+            )
+        )
+    return len(starting), len(ending)
@@ -0,0 +1,160 @@
+import re
+from functools import lru_cache
+from typing import Iterable, Iterator, List, Tuple
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, FloatField, IntegerField, Q, QuerySet, Value, When
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .models import Product
+
+SEARCH_TABLE = "products_search"
+
+
+def search_terms(text: str) -> List[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+def search_documents(
+    product_ids: Iterable[int],
+) -> Iterator[Tuple[int, str, str, str, str]]:
+    """Yield (id, title, description, specifications, tags) for the products."""
+    products = (
+        Product.objects.filter(id__in=list(product_ids))
+        .select_related("category__parent")
+        .prefetch_related(
+            "specifications", "category__tags", "category__parent__tags"
+        )
+    )
+    for product in products:
+        specifications = " ".join(
+            f"{spec.name} {spec.value or ''}" for spec in product.specifications.all()
+        )
+        tags = []
+        if product.category:
+            tags.extend(product.category.tags.all())
+            if product.category.parent:
+                tags.extend(product.category.parent.tags.all())
+        yield (
+            product.id,
+            product.title,
+            product.description or "",
+            specifications,
+            " ".join(tag.name for tag in tags),
+        )
+
+
+class BaseSearchBackend:
+    """Filters a product queryset by a search text and annotates ``search_rank``.
+
+    Lower ``search_rank`` values are better matches.
+    """
+
+    def index(self, product_ids: Iterable[int]) -> None:
+        pass
+
+    def remove(self, product_ids: Iterable[int]) -> None:
+        pass
+
+    def rebuild(self) -> None:
+        self.index(Product.objects.values_list("id", flat=True))
+
+    def search(self, queryset: QuerySet[Product], text: str) -> QuerySet[Product]:
+        raise NotImplementedError
+
+    def no_match(self, queryset: QuerySet[Product]) -> QuerySet[Product]:
+        return queryset.annotate(search_rank=Value(0.0)).none()
+
+
+class DatabaseSearchBackend(BaseSearchBackend):
+    """Index-free fallback that works on any database."""
+
+    def search(self, queryset: QuerySet[Product], text: str) -> QuerySet[Product]:
+        terms = search_terms(text)
+        if not terms:
+            return self.no_match(queryset)
+        matches = Product.objects.all()
+        for term in terms:
+            matches = matches.filter(
+                Q(title__icontains=term)
+                | Q(description__icontains=term)
+                | Q(specifications__value__icontains=term)
+                | Q(category__tags__name__icontains=term)
+                | Q(category__parent__tags__name__icontains=term)
+            )
+        title_match = Q()
+        for term in terms:
+            title_match &= Q(title__icontains=term)
+        return queryset.filter(id__in=matches.values("id")).annotate(
+            search_rank=Case(
+                When(title_match, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField(),
+            )
+        )
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    """Ranked prefix search over an FTS5 table keyed by product id."""
+
+    # bm25 weights of the title, description, specifications and tags columns
+    weights = (10.0, 1.0, 2.0, 5.0)
+
+    def index(self, product_ids: Iterable[int]) -> None:
+        product_ids = list(product_ids)
+        self.remove(product_ids)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {SEARCH_TABLE} "
+                "(rowid, title, description, specifications, tags) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                list(search_documents(product_ids)),
+            )
+
+    def remove(self, product_ids: Iterable[int]) -> None:
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s",
+                [(pk,) for pk in product_ids],
+            )
+
+    def rebuild(self) -> None:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        super().rebuild()
+
+    def search(self, queryset: QuerySet[Product], text: str) -> QuerySet[Product]:
+        terms = search_terms(text)
+        if not terms:
+            return self.no_match(queryset)
+        match = " ".join(f'"{term}"*' for term in terms)
+        weights = ", ".join(str(weight) for weight in self.weights)
+        table = Product._meta.db_table
+        return queryset.filter(
+            id__in=RawSQL(
+                f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s",
+                (match,),
+            )
+        ).annotate(
+            search_rank=RawSQL(
+                f"SELECT bm25({SEARCH_TABLE}, {weights}) FROM {SEARCH_TABLE} "
+                f'WHERE {SEARCH_TABLE} MATCH %s AND rowid = "{table}"."id"',
+                (match,),
+                output_field=FloatField(),
+            )
+        )
+
+
+@lru_cache(maxsize=None)
+def get_search_backend() -> BaseSearchBackend:
+    backend = getattr(settings, "PRODUCT_SEARCH_BACKEND", None)
+    if backend:
+        return import_string(backend)()
+    if (
+        connection.vendor == "sqlite"
+        and SEARCH_TABLE in connection.introspection.table_names()
+    ):
+        return SQLiteSearchBackend()
+    return DatabaseSearchBackend()
@@ -1,8 +1,6 @@
-import decimal
-from _decimal import Decimal
-from typing import Dict, Type, Union
+from typing import Dict, List, Optional, Type, Union
 
-from django.db.models import Avg, QuerySet
+from django.db.models import Manager, Prefetch, prefetch_related_objects
 from django.utils.timezone import now
 from rest_framework import serializers as s
 
@@ -33,9 +31,13 @@ class CategorySerializer(s.ModelSerializer):
     subcategories = s.SerializerMethodField()
 
     def get_subcategories(self, category: Category):
-        subcategory = Category.objects.filter(parent=category).all()
+        children = self.context.get("children")
+        if children is not None:
+            subcategory = children.get(category.id)
+        else:
+            subcategory = Category.objects.filter(parent=category).all()
         if subcategory:
-            return CategorySerializer(subcategory, many=True).data
+            return CategorySerializer(subcategory, many=True, context=self.context).data
         return None
 
     class Meta:
@@ -74,6 +76,31 @@ class SpecificationsSerializer(s.ModelSerializer):
         fields = ["name", "value"]
 
 
+class ProductListSerializer(s.ListSerializer):
+    """Serializes a page of products with a fixed number of queries.
+
+    Everything the product fields read is fetched once for the whole page, so
+    the query count does not grow with the number of products.
+    """
+
+    def to_representation(self, data) -> List[Dict]:
+        products = list(data.all() if isinstance(data, Manager) else data)
+        prefetch_related_objects(
+            products,
+            Prefetch(
+                "review",
+                queryset=Review.objects.filter(is_checked=True).order_by("id"),
+                to_attr="checked_reviews",
+            ),
+            "specifications",
+            "images",
+            "category__parent",
+            "category__tags",
+            "category__parent__tags",
+        )
+        return super().to_representation(products)
+
+
 class ProductSerializer(s.ModelSerializer):
     category = s.SerializerMethodField()
     reviews = s.SerializerMethodField()
@@ -85,21 +112,21 @@ class ProductSerializer(s.ModelSerializer):
     rating = s.SerializerMethodField()
     # price = s.SerializerMethodField()
 
-    def get_rating(self, obj: Product) -> QuerySet[Review]:
-        return (
-            Review.objects.filter(product=obj).aggregate(Avg("rate")).get("rate__avg")
-        )
+    def get_rating(self, obj: Product) -> Optional[float]:
+        if obj.reviews_count:
+            return float(obj.rating)
+        return None
 
     def get_specifications(self, obj: Product) -> Dict:
-        return SpecificationsSerializer(
-            Specification.objects.filter(product=obj), many=True
-        ).data
+        return SpecificationsSerializer(obj.specifications.all(), many=True).data
 
     def get_description(self, obj: Product) -> str:
         return obj.description[:10]
 
     def get_reviews(self, obj: Product) -> Dict:
-        reviews = Review.objects.filter(product=obj, is_checked=True)
+        reviews = getattr(obj, "checked_reviews", None)
+        if reviews is None:
+            reviews = Review.objects.filter(product=obj, is_checked=True).order_by("id")
         reviews_serialized = ReviewSerializer(reviews, many=True)
         return reviews_serialized.data
 
@@ -107,15 +134,16 @@ class ProductSerializer(s.ModelSerializer):
         return obj.category_id
 
     def get_tags(self, obj: Product) -> Union[None, Dict]:
-        if obj.category.parent:
-            parent_tags = obj.category.parent.tags
-            self_tags = obj.category.tags
-            tags = parent_tags.all() | self_tags.all()
+        if obj.category and obj.category.parent:
+            parent_tags = obj.category.parent.tags.all()
+            self_tags = obj.category.tags.all()
+            tags = {tag.id: tag for tag in [*parent_tags, *self_tags]}
             if tags:
-                return TagSerializer(tags, many=True).data
+                return TagSerializer(tags.values(), many=True).data
 
     class Meta:
         model = Product
+        list_serializer_class = ProductListSerializer
         fields = [
             "id",
             "category",
@@ -142,8 +170,7 @@ class ProductSaleSerializer(s.ModelSerializer):
     price = s.SerializerMethodField()
 
     def get_price(self, obj: Product) -> str:
-        return "%.2f" % Decimal(obj.price / (1 - obj.sale.salePrice/100)).quantize(
-                                    Decimal("0.01"), decimal.ROUND_HALF_UP)
+        return "%.2f" % (obj.price if obj.base_price is None else obj.base_price)
 
     def get_salePrice(self, obj: Product) -> str:
         return "%.2f" % obj.price
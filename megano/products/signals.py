@@ -0,0 +1,213 @@
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .cache import bump_versions
+from .cards import refresh_product_cards
+from .facets import refresh_product_tags
+from .sales import reprice_products
+from .models import (
+    Category,
+    CategoryImage,
+    Product,
+    ProductImage,
+    Review,
+    Sale,
+    Specification,
+    Tag,
+)
+from .search import get_search_backend
+from .tree import link_category
+
+
+def _refresh_products(product_ids) -> None:
+    product_ids = list(product_ids)
+    refresh_product_cards(product_ids)
+    refresh_product_tags(product_ids)
+    get_search_backend().index(product_ids)
+
+
+@receiver(post_save, sender=Product)
+def refresh_on_product_save(sender, instance: Product, raw=False, **kwargs) -> None:
+    if not raw:
+        _refresh_products([instance.id])
+
+
+@receiver(post_delete, sender=Product)
+def remove_deleted_product(sender, instance: Product, **kwargs) -> None:
+    get_search_backend().remove([instance.id])
+
+
+@receiver(post_save, sender=Specification)
+@receiver(post_delete, sender=Specification)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def refresh_on_related_change(sender, instance, raw=False, **kwargs) -> None:
+    if not raw:
+        Product.objects.filter(id=instance.product_id).update(
+            updated_at=timezone.now()
+        )
+        _refresh_products([instance.product_id])
+
+
+@receiver(pre_save, sender=Product)
+def derive_product_price(sender, instance: Product, raw=False, **kwargs) -> None:
+    if not raw:
+        instance.update_price()
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def refresh_on_checked_review_change(
+    sender, instance: Review, raw=False, **kwargs
+) -> None:
+    # Reviews waiting for moderation are not shown, so they change nothing
+    if not raw and (instance.is_checked or getattr(instance, "_was_checked", False)):
+        Product.objects.filter(id=instance.product_id).update(
+            updated_at=timezone.now()
+        )
+        refresh_product_cards([instance.product_id])
+
+
+@receiver(post_save, sender=Sale)
+def reprice_on_sale_save(sender, instance: Sale, raw=False, **kwargs) -> None:
+    if not raw:
+        instance.active = instance.is_live(timezone.now())
+        Sale.objects.filter(pk=instance.pk).update(active=instance.active)
+        reprice_products(
+            Product.objects.filter(sale=instance).values_list("id", flat=True)
+        )
+
+
+@receiver(pre_delete, sender=Sale)
+def collect_on_sale_delete(sender, instance: Sale, **kwargs) -> None:
+    instance._repriced_product_ids = list(
+        Product.objects.filter(sale=instance).values_list("id", flat=True)
+    )
+
+
+@receiver(post_delete, sender=Sale)
+def reprice_on_sale_delete(sender, instance: Sale, **kwargs) -> None:
+    reprice_products(getattr(instance, "_repriced_product_ids", []))
+
+
+def _category_product_ids(categories) -> list:
+    return list(
+        Product.objects.filter(
+            category__ancestor_links__ancestor__in=categories
+        ).values_list("id", flat=True)
+    )
+
+
+@receiver(pre_save, sender=Category)
+def remember_category_parent(sender, instance: Category, **kwargs) -> None:
+    instance._old_parent_id = (
+        Category.objects.filter(pk=instance.pk).values_list("parent_id", flat=True).first()
+        if instance.pk
+        else None
+    )
+    if instance.parent_id != instance._old_parent_id:
+        instance.clean()
+
+
+@receiver(post_save, sender=Category)
+def link_category_on_save(
+    sender, instance: Category, created: bool, raw=False, **kwargs
+) -> None:
+    if not raw and (created or instance.parent_id != instance._old_parent_id):
+        link_category(instance)
+
+
+@receiver(post_save, sender=Category)
+def refresh_on_category_save(
+    sender, instance: Category, raw=False, **kwargs
+) -> None:
+    if not raw:
+        _refresh_products(_category_product_ids([instance.id]))
+
+
+@receiver(m2m_changed, sender=Category.tags.through)
+def refresh_on_category_tags_change(
+    sender, instance, action: str, reverse: bool, pk_set, **kwargs
+) -> None:
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            _refresh_products(_category_product_ids([instance.id]))
+    elif action == "pre_clear":
+        instance._refreshed_product_ids = _category_product_ids(instance.category.all())
+    elif action == "post_clear":
+        _refresh_products(getattr(instance, "_refreshed_product_ids", []))
+    elif action in ("post_add", "post_remove"):
+        _refresh_products(_category_product_ids(pk_set))
+
+
+@receiver(post_save, sender=Tag)
+def refresh_on_tag_save(sender, instance: Tag, raw=False, **kwargs) -> None:
+    if not raw:
+        _refresh_products(_category_product_ids(instance.category.all()))
+
+
+@receiver(pre_delete, sender=Tag)
+def collect_on_tag_delete(sender, instance: Tag, **kwargs) -> None:
+    instance._refreshed_product_ids = _category_product_ids(instance.category.all())
+
+
+@receiver(post_delete, sender=Tag)
+def refresh_on_tag_delete(sender, instance: Tag, **kwargs) -> None:
+    _refresh_products(getattr(instance, "_refreshed_product_ids", []))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Sale)
+@receiver(post_delete, sender=Sale)
+@receiver(post_save, sender=Specification)
+@receiver(post_delete, sender=Specification)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def invalidate_products(sender, **kwargs) -> None:
+    bump_versions("products")
+
+
+@receiver(pre_save, sender=Review)
+def remember_review_checked(sender, instance: Review, **kwargs) -> None:
+    instance._was_checked = bool(
+        instance.pk
+        and Review.objects.filter(pk=instance.pk, is_checked=True).exists()
+    )
+    if not instance.is_checked:
+        instance.checked_at = None
+    elif not instance._was_checked:
+        instance.checked_at = timezone.now()
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_checked_review(sender, instance: Review, **kwargs) -> None:
+    if instance.is_checked or getattr(instance, "_was_checked", False):
+        bump_versions("products")
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category(sender, **kwargs) -> None:
+    bump_versions("categories", "products")
+
+
+@receiver(post_save, sender=CategoryImage)
+@receiver(post_delete, sender=CategoryImage)
+def invalidate_category_image(sender, **kwargs) -> None:
+    bump_versions("categories")
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(m2m_changed, sender=Category.tags.through)
+def invalidate_tags(sender, **kwargs) -> None:
+    bump_versions("tags", "products")
@@ -1,3 +1,192 @@
+import random
+from datetime import timedelta
+from decimal import ROUND_HALF_UP, Decimal
+from unittest import mock, skipUnless
+
+from django.core.cache import cache
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import repricing
+from .models import Category, CategoryImage, Product
+from .repricing import PriceTable
+from .views import CatalogView
+
+
+def make_category(title: str, parent: Category = None) -> Category:
+    return Category.objects.create(
+        title=title, image=CategoryImage.objects.create(), parent=parent
+    )
+
+
+def make_product(title: str, category: Category, price: int, **fields) -> Product:
+    return Product.objects.create(
+        title=title,
+        description=title,
+        category=category,
+        price=price,
+        base_price=price,
+        **fields,
+    )
+
+
+class CatalogFacetsTests(TestCase):
+    def setUp(self) -> None:
+        self.root = make_category("Root")
+        self.phones = make_category("Phones", self.root)
+        self.laptops = make_category("Laptops", self.root)
+        make_product("Cable", self.root, 100)
+        make_product("Phone", self.phones, 200)
+        make_product("Smartphone", self.phones, 300)
+        make_product("Laptop", self.laptops, 400)
+        self.client = APIClient()
+
+    def facets(self, **params) -> dict:
+        response = self.client.get("/api/catalog/facets", params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_selected_category_counts_its_subcategories(self) -> None:
+        facets = self.facets(category=self.root.id)
+        self.assertEqual(
+            facets["categories"],
+            [
+                {"id": self.root.id, "count": 4},
+                {"id": self.phones.id, "count": 2},
+                {"id": self.laptops.id, "count": 1},
+            ],
+        )
+
+    def test_category_counts_follow_the_other_filters(self) -> None:
+        facets = self.facets(**{"category": self.root.id, "filter[minPrice]": 250})
+        self.assertEqual(
+            facets["categories"],
+            [
+                {"id": self.root.id, "count": 2},
+                {"id": self.phones.id, "count": 1},
+                {"id": self.laptops.id, "count": 1},
+            ],
+        )
+
+    def test_price_range_ignores_the_price_filter(self) -> None:
+        facets = self.facets(**{"filter[minPrice]": 250, "filter[maxPrice]": 350})
+        self.assertEqual(facets["total"], 1)
+        self.assertEqual(
+            (facets["price"]["min"], facets["price"]["max"]), (100, 400)
+        )
+
+    def test_price_range_follows_the_other_filters(self) -> None:
+        facets = self.facets(category=self.phones.id)
+        self.assertEqual(
+            (facets["price"]["min"], facets["price"]["max"]), (200, 300)
+        )
+
+
+class CatalogCursorTests(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        category = make_category("Phones")
+        now = timezone.now()
+        # Few distinct values, so pages end in the middle of ties
+        for i in range(10):
+            make_product(
+                f"Phone {i}",
+                category,
+                10 * (i % 3),
+                rating=i % 2 + 4,
+                reviews_count=i % 4,
+                date=now - timedelta(days=i % 3),
+            )
+        self.client = APIClient()
+
+    def walk(self, **params) -> list:
+        ids, cursor = [], ""
+        while cursor is not None:
+            response = self.client.get(
+                "/api/catalog/", {**params, "limit": 3, "cursor": cursor}
+            )
+            self.assertEqual(response.status_code, 200)
+            ids += [card["id"] for card in response.data["items"]]
+            cursor = response.data["nextCursor"]
+        return ids
+
+    def test_every_sort_is_walked_once(self) -> None:
+        for sort, field in CatalogView.sort_fields.items():
+            for sort_type in ("inc", "dec"):
+                rows = Product.objects.values_list(field, "id")
+                expected = [pk for _, pk in sorted(rows, reverse=sort_type == "dec")]
+                ids = self.walk(sort=sort, sortType=sort_type)
+                self.assertEqual(ids, expected, (sort, sort_type))
+
+    def test_search_is_walked_once(self) -> None:
+        ids = self.walk(**{"filter[name]": "phone"})
+        self.assertCountEqual(ids, Product.objects.values_list("id", flat=True))
+
+    def test_invalid_cursor_is_not_found(self) -> None:
+        for params in (
+            {"sort": "date", "cursor": "WyJ4IiwxXQ=="},  # ["x", 1]
+            {"sort": "price", "cursor": "WyJ4IiwxXQ=="},
+            {"sort": "date", "cursor": "W251bGwsMV0="},  # [null, 1]
+            {"filter[name]": "phone", "cursor": "WyJ4IiwxXQ=="},
+            {"cursor": "not a cursor"},
+        ):
+            response = self.client.get("/api/catalog/", params)
+            self.assertEqual(response.status_code, 404, params)
+
+
+class PriceTableRoundingTests(TestCase):
+    """The integer columns round like ``Decimal.quantize(ROUND_HALF_UP)``."""
+
+    cent = Decimal("0.01")
+    markups = ("10", "-10", "2.5", "-2.5", "0.01", "-0.01", "33.33", "-99.99")
+
+    def rows(self) -> list:
+        generator = random.Random(15)
+        rows = [
+            (
+                pk,
+                None,
+                Decimal(generator.randint(1, 10000000)) * self.cent,
+                Decimal(0),
+                Decimal(generator.choice(("0", "0", "5", "12.5", "33.33", "50"))),
+            )
+            for pk in range(20000)
+        ]
+        # Cents ending in 5 give half-cent ties with 10% and 2.5% markups
+        rows += [
+            (20000 + cents, None, cents * self.cent, Decimal(0), Decimal(0))
+            for cents in range(1, 400, 2)
+        ]
+        return rows
+
+    def expected(self, rows: list, percents: tuple) -> list:
+        changes = []
+        for pk, _, base, price, discount in rows:
+            new_base = base
+            for percent in percents:
+                new_base = (new_base * (100 + Decimal(percent)) / 100).quantize(
+                    self.cent, ROUND_HALF_UP
+                )
+            new_price = (new_base * (100 - discount) / 100).quantize(
+                self.cent, ROUND_HALF_UP
+            )
+            if (base, price) != (new_base, new_price):
+                changes.append((pk, base, new_base, price, new_price))
+        return changes
+
+    def check_markups(self) -> None:
+        rows = self.rows()
+        for percents in [(percent,) for percent in self.markups] + [("10", "-2.5")]:
+            table = PriceTable(rows)
+            for percent in percents:
+                table.change_base(percent)
+            self.assertEqual(table.changes(), self.expected(rows, percents), percents)
+
+    @skipUnless(repricing.numpy, "NumPy is not installed")
+    def test_numpy_columns(self) -> None:
+        self.check_markups()
 
-# Create your tests here.
+    def test_list_columns(self) -> None:
+        with mock.patch.object(repricing, "numpy", None):
+            self.check_markups()
@@ -0,0 +1,80 @@
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from django.core.cache import cache
+
+from .cache import get_versions
+from .models import Category, CategoryClosure
+from .serializers import CategorySerializer
+
+
+def build_category_tree() -> List[Dict]:
+    """Serialize the whole category tree from a single query."""
+    children = defaultdict(list)
+    for category in Category.objects.select_related("image").order_by("id"):
+        children[category.parent_id].append(category)
+    return CategorySerializer(
+        children[None], many=True, context={"children": children}
+    ).data
+
+
+def category_tree() -> List[Dict]:
+    """Return the category tree, cached until a category or its image changes."""
+    version = get_versions(["categories"])["categories"]
+    key = f"category-tree:{version}"
+    tree = cache.get(key)
+    if tree is None:
+        tree = build_category_tree()
+        cache.set(key, tree, None)
+    return tree
+
+
+def closure_rows(parents: Dict[int, Optional[int]]) -> List[Tuple[int, int, int]]:
+    """Return (ancestor, descendant, depth) rows for a category → parent map."""
+    rows = []
+    for category_id in parents:
+        ancestor_id, depth, seen = category_id, 0, set()
+        while ancestor_id is not None and ancestor_id not in seen:
+            seen.add(ancestor_id)
+            rows.append((ancestor_id, category_id, depth))
+            ancestor_id, depth = parents.get(ancestor_id), depth + 1
+    return rows
+
+
+def rebuild_category_closure() -> None:
+    parents = dict(Category.objects.values_list("id", "parent_id"))
+    CategoryClosure.objects.all().delete()
+    CategoryClosure.objects.bulk_create(
+        CategoryClosure(ancestor_id=ancestor, descendant_id=descendant, depth=depth)
+        for ancestor, descendant, depth in closure_rows(parents)
+    )
+
+
+def link_category(category: Category) -> None:
+    """Attach the subtree of a new or moved category below its current parent."""
+    CategoryClosure.objects.get_or_create(
+        ancestor_id=category.id, descendant_id=category.id, defaults={"depth": 0}
+    )
+    subtree = list(
+        CategoryClosure.objects.filter(ancestor_id=category.id).values_list(
+            "descendant_id", "depth"
+        )
+    )
+    subtree_ids = [descendant for descendant, _ in subtree]
+    CategoryClosure.objects.filter(descendant_id__in=subtree_ids).exclude(
+        ancestor_id__in=subtree_ids
+    ).delete()
+    if category.parent_id is None:
+        return
+    ancestors = CategoryClosure.objects.filter(
+        descendant_id=category.parent_id
+    ).values_list("ancestor_id", "depth")
+    CategoryClosure.objects.bulk_create(
+        CategoryClosure(
+            ancestor_id=ancestor,
+            descendant_id=descendant,
+            depth=ancestor_depth + descendant_depth + 1,
+        )
+        for ancestor, ancestor_depth in ancestors
+        for descendant, descendant_depth in subtree
+    )
@@ -1,12 +1,13 @@
 from django.urls import path
 from .views import \
-    CategoriesView, CatalogView, PopularProductView, LimitedProduct, BannerProduct, ProductDetailView, TagView, \
+    CategoriesView, CatalogView, CatalogFacetsView, PopularProductView, LimitedProduct, BannerProduct, ProductDetailView, TagView, \
     ReviewView, SalesView
 
 urlpatterns = [
 
     path('categories/', CategoriesView.as_view(), name='categories'),
     path('catalog/', CatalogView.as_view(), name='catalog'),
+    path('catalog/facets', CatalogFacetsView.as_view(), name='catalog_facets'),
     path('products/popular', PopularProductView.as_view(), name='popular_product'),
     path('products/limited', LimitedProduct.as_view(), name='limited_product'),
     path('banners', BannerProduct.as_view(), name='banners_product'),
@@ -1,12 +1,24 @@
+from datetime import datetime
+from typing import Optional
+
 from _decimal import Decimal
-from django.db.models import QuerySet, Count, Q, Avg
-from rest_framework.pagination import PageNumberPagination
+from django.db import transaction
+from django.db.models import QuerySet, F
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.request import Request
+from .banners import sample_banner_products
+from .cache import cache_response, conditional_response, get_versions
+from .cards import card_rows, product_cards
+from .facets import catalog_facets, filter_by_tags
 from .models import Category, Product, Tag, Review
+from .pagination import KeysetPagination
+from .reviews import update_review_stats
+from .search import get_search_backend
+from .tree import category_tree
 from .serializers import (
-    CategorySerializer,
     ProductSerializer,
     TagSerializer,
     ReviewSerializer,
@@ -14,36 +26,59 @@ from .serializers import (
 )
 
 
+def product_last_modified(request: Request, pk) -> Optional[datetime]:
+    return Product.objects.filter(id=pk).values_list("updated_at", flat=True).first()
+
+
+def product_etag(request: Request, pk) -> Optional[str]:
+    updated_at = product_last_modified(request, pk)
+    if updated_at is None:
+        return None
+    versions = get_versions(("categories", "tags"))
+    return "product:{}:{}:{}:{}".format(
+        pk, updated_at.timestamp(), versions["categories"], versions["tags"]
+    )
+
+
 class CategoriesView(APIView):
+    @conditional_response("categories")
+    @cache_response("categories")
     def get(self, request: Request) -> Response:
-        q_data = Category.objects.filter(parent=None)
-        serialized = CategorySerializer(q_data, many=True)
-        return Response(data=serialized.data, status=200)
+        return Response(data=category_tree(), status=200)
 
 
-class CatalogView(APIView, PageNumberPagination):
+class CatalogView(APIView, KeysetPagination):
     page_size = 3
     page_query_param = "currentPage"
     page_size_query_param = "limit"
     max_page_size = 4
-
-    def get(self, request: Request) -> Response:
+    sort_fields = {
+        "rating": "rating",
+        "reviews": "reviews_count",
+        "price": "price",
+        "date": "date",
+    }
+
+    def get_filtered_queryset(
+        self, request: Request, with_tags: bool = True, with_price: bool = True
+    ) -> QuerySet[Product]:
         category = request.query_params.get("category")
         if category:
             queryset = Product.objects.filter(
-                Q(category_id=category) | Q(category__parent_id=category)
-            ).prefetch_related("images")
+                category__ancestor_links__ancestor_id=category
+            )
         else:
-            queryset = Product.objects.prefetch_related("images")
+            queryset = Product.objects.all()
         name = request.query_params.get("filter[name]")
         if name:
-            queryset = queryset.filter(
-                Q(description__icontains=name) | Q(title__icontains=name)
-            )
+            queryset = get_search_backend().search(queryset, name)
 
-        min_price = Decimal(request.query_params.get("filter[minPrice]", 0))
-        max_price = Decimal(request.query_params.get("filter[maxPrice]", 50000))
-        queryset = queryset.filter(price__range=(min_price, max_price))
+        if with_price:
+            min_price = Decimal(request.query_params.get("filter[minPrice]", 0))
+            queryset = queryset.filter(price__gte=min_price)
+            max_price = request.query_params.get("filter[maxPrice]")
+            if max_price:
+                queryset = queryset.filter(price__lte=Decimal(max_price))
 
         free_delivery = request.query_params.get("filter[freeDelivery]")
         if free_delivery == "true":
@@ -54,84 +89,103 @@ class CatalogView(APIView, PageNumberPagination):
             queryset = queryset.filter(count__gt=0)
 
         tags = request.query_params.getlist("tags[]")
-        if tags:
-            req_category = Category.objects.filter(
-                Q(tags__in=tags) | Q(parent__tags__in=tags)
-            )
-            queryset = queryset.filter(category__in=list(req_category))
-
-        sort_field = request.query_params.get("sort")
-        sort_type = request.query_params.get("sortType")
-        if sort_field == "rating":
-            if sort_type == "dec":
-                queryset = queryset.order_by("-rating")
-            else:
-                queryset = queryset.order_by("rating")
-        elif sort_field == "reviews":
-            if sort_type == "dec":
-                queryset = queryset.annotate(num_review=Count("review")).order_by(
-                    "-num_review"
-                )
-            else:
-                queryset = queryset.annotate(num_review=Count("review")).order_by(
-                    "num_review"
-                )
-        elif sort_field == "price":
-            if sort_type == "dec":
-                queryset = queryset.order_by("-price")
-            else:
-                queryset = queryset.order_by("price")
-        elif sort_field == "date":
-            if sort_type == "dec":
-                queryset = queryset.order_by("-date")
-            else:
-                queryset = queryset.order_by("date")
+        if tags and with_tags:
+            queryset = filter_by_tags(queryset, tags)
+        return queryset
+
+    @conditional_response("products", "categories", "tags")
+    @cache_response("products", "categories", "tags", anonymous_only=True)
+    def get(self, request: Request) -> Response:
+        queryset = self.get_filtered_queryset(request)
+        name = request.query_params.get("filter[name]")
+        sort_field = self.sort_fields.get(request.query_params.get("sort"))
+        descending = request.query_params.get("sortType") == "dec"
         data = {}
         current_page = int(request.query_params.get("currentPage", 1))
         data["currentPage"] = current_page
-        result_page = self.paginate_queryset(queryset, request, view=self)
-        serializer = ProductSerializer(result_page, many=True)
-        data["items"] = serializer.data
+        if self.is_keyset_request(request):
+            result_page = self.paginate_keyset(
+                queryset.annotate(card_data=F("card__data")),
+                request,
+                sort_field or ("search_rank" if name else "id"),
+                descending,
+            )
+            data["items"] = product_cards(
+                (product.id, product.card_data) for product in result_page
+            )
+            data["lastPage"] = self.get_cached_last_page(queryset, request)
+            data["nextCursor"] = self.next_cursor
+            return Response(data=data, status=200)
+
+        if sort_field:
+            prefix = "-" if descending else ""
+            queryset = queryset.order_by(prefix + sort_field, prefix + "id")
+        elif name:
+            queryset = queryset.order_by("search_rank", "id")
+        else:
+            queryset = queryset.order_by("id")
+        result_page = self.paginate_queryset(card_rows(queryset), request, view=self)
+        data["items"] = product_cards(result_page)
         data["lastPage"] = self.page.paginator.num_pages
 
         return Response(data=data, status=200)
 
 
+class CatalogFacetsView(CatalogView):
+    @conditional_response("products", "categories", "tags")
+    def get(self, request: Request) -> Response:
+        facets = catalog_facets(
+            self.get_filtered_queryset(request),
+            self.get_filtered_queryset(request, with_tags=False),
+            self.get_filtered_queryset(request, with_price=False),
+        )
+        return Response(data=facets, status=200)
+
+
 class PopularProductView(APIView):
+    @conditional_response("products", "categories", "tags", "popularity")
+    @cache_response("products", "categories", "tags", "popularity")
     def get(self, request) -> Response:
-        queryset = (
-            Product.objects.annotate(
-                num_review=Count("review", filter=Q(review__is_checked=True)),
-                avg_rating=Avg("review__rate", filter=Q(review__is_checked=True)),
-            )
-            .order_by("-num_review", "-avg_rating")[:8]
-            .prefetch_related("images")
+        queryset = Product.objects.order_by(
+            F("popularity__score").desc(nulls_last=True),
+            "-reviews_count",
+            "-rating",
+            "id",
         )
-        serialized = ProductSerializer(queryset, many=True)
-        return Response(data=serialized.data, status=200)
+        return Response(data=product_cards(card_rows(queryset)[:8]), status=200)
 
 
 class LimitedProduct(APIView):
+    @conditional_response("products", "categories", "tags")
+    @cache_response("products", "categories", "tags")
     def get(self, request: Request) -> Response:
-        queryset: QuerySet = Product.objects.filter(limited=True)[:5].prefetch_related(
-            "images"
-        )
-        serialized = ProductSerializer(queryset, many=True)
-        return Response(data=serialized.data, status=200)
+        queryset: QuerySet = Product.objects.filter(limited=True)
+        return Response(data=product_cards(card_rows(queryset)[:5]), status=200)
 
 
-class SalesView(APIView, PageNumberPagination):
+class SalesView(APIView, KeysetPagination):
     page_size = 3
 
     page_query_param = "currentPage"
     page_size_query_param = "limit"
     max_page_size = 1000
 
+    @conditional_response("products")
+    @cache_response("products")
     def get(self, request: Request) -> Response:
-        queryset: QuerySet = Product.objects.filter(sale__isnull=False).order_by("id")
+        queryset: QuerySet = Product.objects.filter(sale__active=True).order_by("id")
         data = {}
         current_page = int(request.query_params.get("currentPage", 1))
         data["currentPage"] = current_page
+        if self.is_keyset_request(request):
+            result_page = self.paginate_keyset(
+                queryset.select_related("sale").prefetch_related("images"), request
+            )
+            data["items"] = ProductSaleSerializer(result_page, many=True).data
+            data["lastPage"] = self.get_cached_last_page(queryset, request)
+            data["nextCursor"] = self.next_cursor
+            return Response(data=data, status=200)
+
         result_page = self.paginate_queryset(queryset, request, view=self)
         serializer = ProductSaleSerializer(result_page, many=True)
         data["items"] = serializer.data
@@ -142,50 +196,54 @@ class SalesView(APIView, PageNumberPagination):
 
 class BannerProduct(APIView):
     def get(self, request: Request) -> Response:
-        queryset = Product.objects.all().order_by("?")[:5].prefetch_related("images")
-        serialized = ProductSerializer(queryset, many=True)
-        return Response(data=serialized.data, status=200)
+        return Response(data=sample_banner_products(), status=200)
 
 
 class ProductDetailView(APIView):
+    @method_decorator(
+        condition(etag_func=product_etag, last_modified_func=product_last_modified)
+    )
     def get(self, request: Request, pk) -> Response:
-        product = Product.objects.get(id=pk)
+        product = Product.objects.filter(id=pk).first()
         if product:
             return Response(data=ProductSerializer(product).data, status=200)
         return Response(status=404)
 
 
 class TagView(APIView):
+    @conditional_response("categories", "tags")
+    @cache_response("categories", "tags")
     def get(self, request: Request) -> Response:
         req_category = self.request.query_params.get("category")
         if req_category:
-            req_category = Category.objects.get(
-                id=self.request.query_params.get("category")
-            )
+            req_category = Category.objects.get(id=req_category)
+            links = {"category__ancestor_links__ancestor": req_category}
             if not req_category.parent:
-                child_category = Category.objects.filter(parent=req_category)
-                child_tag = Tag.objects.filter(category__in=list(child_category))
-                tags = child_tag.all()
-            else:
-                self_tags = req_category.tags
-                tags = self_tags.all()
+                links["category__ancestor_links__depth__gt"] = 0
+            tags = Tag.objects.filter(**links).distinct().order_by("id")
         else:
             tags = Tag.objects.all()
         return Response(TagSerializer(tags, many=True).data, status=200)
 
 
 class ReviewView(APIView):
+    # Checked reviews returned after a submission, latest first
+    page_size = 20
+
     def post(self, request: Request, pk) -> Response:
         serialized = ReviewSerializer(data=request.data)
         if serialized.is_valid():
-            product = Product.objects.get(pk=pk)
-            Review.objects.create(product=product, **serialized.data)
-            checked_review = Review.objects.filter(product=product, is_checked=True)
-            new_rating = checked_review.aggregate(Avg("rate")).get("rate__avg")
-            if new_rating:
-                product.rating = new_rating
-                product.save()
+            if not Product.objects.filter(pk=pk).exists():
+                return Response(status=404)
+            review = Review(product_id=pk, **serialized.validated_data)
+            with transaction.atomic():
+                if review.is_checked:
+                    update_review_stats(pk, review.rate, 1)
+                review.save()
+            latest = Review.objects.filter(product_id=pk, is_checked=True).order_by(
+                "-id"
+            )[: self.page_size]
             return Response(
-                data=ReviewSerializer(checked_review, many=True).data, status=200
+                data=ReviewSerializer(list(latest)[::-1], many=True).data, status=200
             )
         return Response(status=400)
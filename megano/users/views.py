@@ -1,4 +1,4 @@
-from django.contrib.auth import authenticate, login, logout
+from django.contrib.auth import authenticate, logout
 from django.contrib.auth.models import User
 from django.core.files.storage import FileSystemStorage
 from django.core.files.uploadedfile import InMemoryUploadedFile
@@ -12,8 +12,8 @@ from upload_validator import FileTypeValidator
 
 from .models import Profile, Avatar
 from .serializers import ProfileSerializer
-from orders.cart import Basket
-from orders.models import Order, OrderItem
+from orders.cart import Basket, login_keeping_basket
+from orders.checkout import login_merging_orders
 
 
 class RegisterView(APIView):
@@ -28,7 +28,7 @@ class RegisterView(APIView):
                 request, username=data["username"], password=data["password"]
             )
             if auth_user is not None:
-                login(request, auth_user)
+                login_keeping_basket(request, auth_user)
 
                 return Response(status=200)
             return Response(status=500)
@@ -41,6 +41,7 @@ class RegisterView(APIView):
 
 class LogOutView(APIView):
     def post(self, request: Request) -> Response:
+        Basket(request).clear()
         logout(request)
         return Response(status=200)
 
@@ -58,54 +59,7 @@ class LogInView(APIView):
             Если же заказа не было, но в корзине были товары на момент авторизации то добавляем их в корзину
             авторизированного пользователя
             """
-            order_by_anon = Order.objects.filter(
-                paid=False, session_id=request.session.session_key
-            ).first()
-            login(request=request, user=user)
-            unfinished_order = Order.objects.filter(
-                paid=False, profile__user=user
-            ).first()
-            basket = Basket(request)
-            if unfinished_order and order_by_anon:
-                order_by_anon.profile = Profile.objects.get(user=user)
-                unfinished_order_items = OrderItem.objects.filter(
-                    order=unfinished_order
-                )
-
-                for un_order_item in unfinished_order_items:
-                    item_in_anon_order_exist = order_by_anon.order_item.filter(
-                        product=un_order_item.product
-                    ).first()
-                    if item_in_anon_order_exist:
-                        item_in_anon_order_exist.count += un_order_item.count
-                        item_in_anon_order_exist.save()
-                    else:
-                        item_in_anon_order_exist = OrderItem.objects.create(
-                            order=order_by_anon,
-                            product=un_order_item.product,
-                            count=un_order_item.count,
-                        )
-                    order_by_anon.totalCost += (
-                        item_in_anon_order_exist.product.price * un_order_item.count
-                    )
-                    basket.add(
-                        un_order_item.product,
-                        quantity=un_order_item.count,
-                    )
-
-                order_by_anon.save()
-                unfinished_order.delete()
-            elif order_by_anon:
-                order_by_anon.delete()
-            elif unfinished_order:
-                list(
-                    map(
-                        lambda add_item: basket.add(
-                            add_item.product, quantity=add_item.count
-                        ),
-                        OrderItem.objects.filter(order=unfinished_order),
-                    )
-                )
+            login_merging_orders(request, user)
             return Response(status=200)
         else:
             return Response(status=500)